@@ -0,0 +1,190 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from config import ADMISSION_MAX_CONCURRENT, ADMISSION_QUEUE_TIMEOUT, ADMISSION_INITIAL_SERVICE_TIME
+
+# 优先级：数字越小越先调度
+PRIORITY_CLASS = 0
+NORMAL_CLASS = 1
+
+
+class AdmissionCancelled(Exception):
+    """排队中的请求被取消"""
+
+
+class AdmissionTimeout(Exception):
+    """排队超过最长等待时间"""
+
+
+@dataclass
+class Ticket:
+    """排队中的一次生成请求"""
+    user_id: str
+    priority_class: int
+    tag: float  # 加权公平队列中的虚拟完成时间
+    seq: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+    admitted_at: Optional[float] = None
+    cancelled: bool = False
+
+    @property
+    def sort_key(self):
+        return (self.priority_class, self.tag, self.seq)
+
+    def __lt__(self, other: 'Ticket') -> bool:
+        return self.sort_key < other.sort_key
+
+
+@dataclass
+class QueueStatus:
+    """某个请求当前的排队情况"""
+    position: int  # 前面还有多少个请求，0 表示下一个执行
+    eta: float  # 预计还要等待的秒数
+
+
+class AdmissionController:
+    def __init__(self,
+                 max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+                 initial_service_time: float = ADMISSION_INITIAL_SERVICE_TIME):
+        """
+        整个进程共享的图片生成准入控制
+        同时进行的预测数不超过 max_concurrent，多出的请求排队：
+        白名单用户优先，普通用户之间按加权公平队列轮流调度，一个用户一次提交多张图不会挤占其他人。
+        :param max_concurrent: 同时进行的预测数上限
+        :param queue_timeout: 最长排队秒数
+        :param initial_service_time: 还没有统计数据时假设的单个预测耗时，用于估算等待时间
+        """
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self.condition = threading.Condition()
+        self.waiting: List[Ticket] = []  # 按 sort_key 排列的堆
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self.last_tag: Dict[str, float] = {}  # 每个用户最后一个请求的虚拟完成时间
+        self.seq = itertools.count()
+
+        # 统计数据
+        self.service_time = initial_service_time  # 单个预测耗时的滑动平均
+        self.waits = deque(maxlen=1000)
+        self.counters = {'admitted': 0, 'timeouts': 0, 'cancelled': 0}
+
+    def enqueue(self, user_id: str, priority: bool = False, weight: float = 1.0) -> Ticket:
+        """提交一个请求，有空闲名额时立即放行"""
+        with self.condition:
+            start = max(self.virtual_time, self.last_tag.get(user_id, 0.0))
+            tag = start + 1.0 / max(weight, 1e-6)
+            self.last_tag[user_id] = tag
+            ticket = Ticket(user_id, PRIORITY_CLASS if priority else NORMAL_CLASS, tag, next(self.seq))
+            heapq.heappush(self.waiting, ticket)
+            self._dispatch()
+            return ticket
+
+    def wait(self, ticket: Ticket, timeout: Optional[float] = None):
+        """阻塞直到请求被放行；取消或超时时抛出异常"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        deadline = ticket.enqueued_at + timeout
+        with self.condition:
+            while ticket.admitted_at is None:
+                if ticket.cancelled:
+                    raise AdmissionCancelled("排队已取消")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._cancel(ticket)
+                    self.counters['timeouts'] += 1
+                    raise AdmissionTimeout(f"排队超时（超过 {timeout:.0f} 秒）")
+                self.condition.wait(remaining)
+
+    def release(self, ticket: Ticket):
+        """预测结束，归还名额"""
+        with self.condition:
+            if ticket.admitted_at is None:
+                self._cancel(ticket)
+                return
+            self.in_flight -= 1
+            elapsed = time.monotonic() - ticket.admitted_at
+            self.service_time = 0.8 * self.service_time + 0.2 * elapsed
+            self._dispatch()
+
+    def cancel(self, ticket: Ticket):
+        """取消还在排队的请求，已放行的不受影响"""
+        with self.condition:
+            if ticket.admitted_at is None and not ticket.cancelled:
+                self._cancel(ticket)
+                self.counters['cancelled'] += 1
+
+    @contextmanager
+    def admit(self, user_id: Optional[str] = None, priority: bool = False,
+              on_ticket: Optional[Callable[[Ticket], None]] = None):
+        """
+        排队等待一个名额，退出时归还
+        :param on_ticket: 入队后立即回调，调用方可以用来查询排队位置或取消
+        """
+        ticket = self.enqueue(user_id or '', priority)
+        if on_ticket is not None:
+            on_ticket(ticket)
+        try:
+            self.wait(ticket)
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def status(self, ticket: Ticket) -> Optional[QueueStatus]:
+        """请求的排队位置和预计等待时间，已放行或已取消时返回 None"""
+        with self.condition:
+            if ticket.admitted_at is not None or ticket.cancelled:
+                return None
+            position = sum(1 for t in self.waiting if not t.cancelled and t < ticket)
+            # 前面的请求每 max_concurrent 个为一轮，每轮约一个平均耗时
+            rounds = math.ceil((position + 1) / self.max_concurrent)
+            return QueueStatus(position, rounds * self.service_time)
+
+    def stats(self) -> Dict:
+        """队列长度、等待时间等指标"""
+        with self.condition:
+            waiting = [t for t in self.waiting if not t.cancelled]
+            waits = sorted(self.waits)
+            now = time.monotonic()
+            return {
+                'in_flight': self.in_flight,
+                'max_concurrent': self.max_concurrent,
+                'queue_depth': len(waiting),
+                'queue_depth_priority': sum(1 for t in waiting if t.priority_class == PRIORITY_CLASS),
+                'oldest_wait': max((now - t.enqueued_at for t in waiting), default=0.0),
+                'wait_avg': sum(waits) / len(waits) if waits else 0.0,
+                'wait_p95': waits[int(len(waits) * 0.95)] if waits else 0.0,
+                'service_time': self.service_time,
+                **self.counters,
+            }
+
+    def _cancel(self, ticket: Ticket):
+        """标记取消，堆里的条目在调度时跳过（调用时需持有锁）"""
+        ticket.cancelled = True
+        self.condition.notify_all()
+
+    def _dispatch(self):
+        """有空闲名额时按顺序放行排队的请求（调用时需持有锁）"""
+        admitted = False
+        while self.waiting and self.in_flight < self.max_concurrent:
+            ticket = heapq.heappop(self.waiting)
+            if ticket.cancelled:
+                continue
+            ticket.admitted_at = time.monotonic()
+            self.in_flight += 1
+            self.virtual_time = max(self.virtual_time, ticket.tag)
+            self.waits.append(ticket.admitted_at - ticket.enqueued_at)
+            self.counters['admitted'] += 1
+            admitted = True
+
+        # 清理已经落后于虚拟时间的用户记录，避免字典无限增长
+        if admitted and len(self.last_tag) > 1000:
+            self.last_tag = {u: t for u, t in self.last_tag.items() if t > self.virtual_time}
+        if admitted:
+            self.condition.notify_all()
@@ -1,11 +1,13 @@
 import streamlit as st
 from article_fetcher import fetch_article, clean_text
-from utils import generate_prompts, combine_images
+from utils import PROMPT_COUNT
+from image_pipeline import COVER_SIZE, OUTPUT_FORMATS, build_zip
+from logo_preview import LogoPreview
 from rate_limiter import RateLimiter
-import replicate
-from PIL import Image
-import requests
-from io import BytesIO
+from image_generator import admission
+from result_store import result_store
+from job_queue import JobQueue, QUEUED, FAILED
+from similarity_index import get_similarity_index
 import os
 from config import *
 
@@ -18,8 +20,19 @@ st.title("活水智能封面生成器 🎨")
 # 使用固定的测试用户ID
 user_id = "test_user"
 
-# 初始化速率限制器
-rate_limiter = RateLimiter(limit=3, window=24)
+# 初始化速率限制器，整个进程只创建一次，页面重新运行时直接复用
+@st.cache_resource
+def get_rate_limiter():
+    return RateLimiter(limit=3, window=24)
+
+rate_limiter = get_rate_limiter()
+
+# 后台任务队列，整个进程共享同一组工作线程
+@st.cache_resource
+def get_job_queue():
+    return JobQueue()
+
+job_queue = get_job_queue()
 
 # 获取使用情况信息
 _, info = rate_limiter.get_usage_info(user_id)
@@ -27,6 +40,31 @@ _, info = rate_limiter.get_usage_info(user_id)
 # 显示剩余次数
 st.info(f"今日剩余使用次数: {info['remaining_requests']} 次 ({info['reset_in']})")
 
+# 白名单用户可以查看生成队列的运行状态
+if user_id in rate_limiter.whitelist:
+    with st.expander("生成队列状态"):
+        stats = admission.stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("进行中", f"{stats['in_flight']}/{stats['max_concurrent']}")
+        col2.metric("排队数", stats['queue_depth'])
+        col3.metric("平均等待", f"{stats['wait_avg']:.1f}秒")
+        col4.metric("P95等待", f"{stats['wait_p95']:.1f}秒")
+        
+        stats = result_store.stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("缓存的任务", stats['jobs'])
+        col2.metric("结果占用内存", f"{stats['resident_bytes'] / 1024 / 1024:.1f}MB",
+                    help=f"上限 {stats['memory_budget'] / 1024 / 1024:.0f}MB")
+        col3.metric("已转存到磁盘", stats['spilled_entries'])
+        col4.metric("累计转存次数", stats['spills'])
+        
+        stats = job_queue.stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("执行中任务", f"{stats['running']}/{stats['workers']}")
+        col2.metric("等待执行", stats['queued'])
+        col3.metric("合并的重复请求", stats['coalesced'])
+        col4.metric("相似文章索引", get_similarity_index().stats()['entries'])
+
 # 添加文本输入框和字数统计
 article_text = st.text_area(
     "请输入文章内容：",
@@ -48,25 +86,11 @@ with st.expander("Logo 设置（可选）"):
     )
     
     if uploaded_logo:
-        # 创建一个预览画布 - 统一使用 900x383
-        preview_width = 900
-        preview_height = 383
-        
-        # 创建示例背景图
-        preview_bg = Image.new('RGB', (preview_width, preview_height), (240, 240, 240))
-        
-        # 加载logo
-        logo_img = Image.open(uploaded_logo)
-        
-        # 如果是RGBA模式，裁剪掉透明边缘
-        if logo_img.mode == 'RGBA':
-            # 获取alpha通道
-            alpha = logo_img.split()[3]
-            # 获取非透明区域的边界框
-            bbox = alpha.getbbox()
-            if bbox:
-                # 裁剪到非透明区域
-                logo_img = logo_img.crop(bbox)
+        # 每个会话一个增量预览，拖动滑块时只重新计算变化的部分
+        if 'logo_preview' not in st.session_state:
+            st.session_state.logo_preview = LogoPreview(COVER_SIZE)
+        logo_preview = st.session_state.logo_preview
+        logo_preview.set_logo(uploaded_logo)
         
         # 使用 columns 布局调整控件
         col1, col2 = st.columns([2, 1])
@@ -104,54 +128,128 @@ with st.expander("Logo 设置（可选）"):
             )
         
         with col1:
-            # 计算 logo 实际大小和位置
-            logo_width = int(preview_width * logo_size / 100)
-            aspect_ratio = logo_img.width / logo_img.height
-            logo_height = int(logo_width / aspect_ratio)
-            
-            # 调整 logo 大小
-            logo_img = logo_img.resize((logo_width, logo_height), Image.Resampling.LANCZOS)
-            
-            # 计算位置
-            x = int((preview_width - logo_width) * x_pos / 100)
-            y = int((preview_height - logo_height) * y_pos / 100)
-            
-            # 创建预览图
-            preview = preview_bg.copy()
-            if logo_img.mode == 'RGBA':
-                # 处理透明度
-                logo_with_opacity = logo_img.copy()
-                if opacity < 100:
-                    # 获取alpha通道
-                    alpha = logo_with_opacity.split()[3]
-                    # 调整alpha通道的值
-                    alpha = alpha.point(lambda x: int(x * opacity / 100))
-                    # 将调整后的alpha通道放回图片
-                    logo_with_opacity.putalpha(alpha)
-                preview.paste(logo_with_opacity, (x, y), logo_with_opacity)
-            else:
-                # 如果不是RGBA模式，先转换
-                logo_with_opacity = logo_img.convert('RGBA')
-                if opacity < 100:
-                    # 创建新的alpha通道
-                    alpha = Image.new('L', logo_img.size, int(255 * opacity / 100))
-                    logo_with_opacity.putalpha(alpha)
-                preview.paste(logo_with_opacity, (x, y), logo_with_opacity)
-            
             # 显示预览
+            preview = logo_preview.render(logo_size, x_pos, y_pos, opacity)
             st.image(preview, caption="Logo 位置预览", use_container_width=True)
             
             # 添加网格线帮助对齐
             if st.checkbox("显示网格线", value=False, key="show_grid"):
-                # 在预览图上绘制网格线
-                from PIL import ImageDraw
-                draw = ImageDraw.Draw(preview)
-                # 绘制水平和垂直线
-                for i in range(0, preview_width, 100):
-                    draw.line([(i, 0), (i, preview_height)], fill=(200, 200, 200), width=1)
-                for i in range(0, preview_height, 100):
-                    draw.line([(0, i), (preview_width, i)], fill=(200, 200, 200), width=1)
-                st.image(preview, caption="Logo 位置预览（带网格）", use_container_width=True)
+                st.image(logo_preview.render_grid(), caption="Logo 位置预览（带网格）", use_container_width=True)
+
+# 下载文件的大小上限
+SIZE_LIMITS = {
+    "图片素材（10MB）": WECHAT_IMAGE_MAX_BYTES,
+    "缩略图素材（64KB）": WECHAT_THUMB_MAX_BYTES,
+}
+
+# 输出格式设置：每张封面只编码一次，显示和下载共用同一份文件
+format_col, limit_col = st.columns(2)
+output_format = format_col.selectbox(
+    "下载格式",
+    list(OUTPUT_FORMATS),
+    help="PNG 无损；JPEG/WebP 会自动选择不超过大小上限的最高质量。公众号素材不支持 WebP"
+)
+size_limit = limit_col.selectbox("文件大小上限", list(SIZE_LIMITS))
+
+def show_download_all(files):
+    """把已经编码好的封面直接打包，显示全部下载按钮"""
+    st.download_button(
+        "下载全部封面",
+        data=build_zip(files),
+        file_name="all_covers.zip",
+        mime="application/zip",
+        on_click="ignore",
+        type="primary"
+    )
+
+def show_job_covers(job):
+    """显示任务的进度和已经完成的封面"""
+    if job.status == FAILED:
+        st.error(f"发生错误: {job.error}")
+        return
+    if job.status == QUEUED:
+        st.info("⏳ 任务排队中，可以离开或刷新页面，稍后通过当前链接查看结果")
+        return
+    st.success("✅ 文章处理成功")
+    
+    covers = {cover.index: cover for cover in job_queue.covers(job.id)}
+    if len(covers) == PROMPT_COUNT:
+        st.success("✅ 提示词生成成功")
+        with st.expander("查看生成的提示词"):
+            for i in sorted(covers):
+                st.text(f"提示词 {i + 1}:\n{covers[i].prompt}")
+    
+    # 排队时显示位置和预计等待时间
+    if job.queue_position is not None and not job.finished:
+        st.info(f"⏳ 当前使用人数较多，前面还有 {job.queue_position} 个任务，预计等待 {job.queue_eta:.0f} 秒")
+    
+    cols = st.columns(PROMPT_COUNT)
+    files = []
+    for index, col in enumerate(cols):
+        idx = index + 1
+        cover = covers.get(index)
+        with col:
+            if cover is None:
+                st.info(f"⏳ 封面 {idx} 生成中...")
+                continue
+            if not cover.ok:
+                st.error(f"生成第 {idx} 张图片时出错: {cover.error}")
+                continue
+            data = job_queue.cover_data(job.id, cover.name)
+            if data is None:
+                continue
+            files.append((cover.name, data))
+            st.image(data, caption=cover.caption, use_container_width=True)
+            st.download_button(
+                f"下载封面 {idx}",
+                data=data,
+                file_name=cover.name,
+                mime=cover.mime,
+                on_click="ignore",
+                key=f"download_{idx}",
+                use_container_width=True
+            )
+    
+    # 最后一张完成后再打包全部下载
+    if job.finished and files:
+        if len(files) == PROMPT_COUNT:
+            st.success("✅ 所有封面生成成功")
+        show_download_all(files)
+
+def show_job(job_id):
+    """按任务 ID 显示结果，任务未结束时定时刷新这一部分"""
+    job = job_queue.get(job_id)
+    if job is None:
+        st.warning("任务不存在或已过期，请重新生成")
+        return
+    
+    @st.fragment(run_every=None if job.finished else JOB_POLL_INTERVAL)
+    def job_panel():
+        current = job_queue.get(job_id)
+        show_job_covers(current)
+        # 任务结束后整页重新运行一次，停止定时刷新
+        if current.finished and not job.finished:
+            st.rerun()
+    
+    job_panel()
+
+# 默认复用同一篇文章之前生成的提示词
+regenerate = st.checkbox("重新生成提示词", value=False, help="勾选后不使用缓存，重新调用模型生成新的提示词")
+
+# 与之前生成过的文章内容相近（转载、改标题、小修改）时，可以直接复用那次的提示词和封面
+# 查找结果按文章内容缓存在会话中，只在文章变化后重新查找，勾选框等操作触发的重新运行不再计算指纹
+similar = None
+if word_count >= 5 and not regenerate:
+    text_digest = get_similarity_index().digest(article_text)
+    if st.session_state.get('similar_digest') != text_digest:
+        st.session_state.similar_digest = text_digest
+        st.session_state.similar = get_similarity_index().lookup(clean_text(article_text))
+    similar = st.session_state.similar
+reuse_similar = similar is not None and st.checkbox(
+    f"复用相似文章的提示词和封面（相似度 {similar.similarity:.0%}）",
+    value=True,
+    help=f"与之前生成过的「{similar.title}」内容相近，复用时不再调用模型"
+)
 
 if st.button("生成封面"):
     if word_count < 5:
@@ -167,197 +265,20 @@ if st.button("生成封面"):
     if not allowed:
         st.error(f"已达到今日使用限制，请{info['reset_in']}再试")
     else:
-        with st.spinner('处理中...'):
-            try:
-                # 清理文本
-                article = clean_text(article_text)
-                st.success("✅ 文章处理成功")
-                
-                # 2. 生成提示词
-                with st.spinner('正在生成提示词...'):
-                    prompts = generate_prompts(article)
-                    if prompts:
-                        st.success("✅ 提示词生成成功")
-                        with st.expander("查看生成的提示词"):
-                            for i, p in enumerate(prompts, 1):
-                                st.text(f"提示词 {i}:\n{p}")
-                
-                # 3. 生成图片
-                images = []
-                for i, prompt in enumerate(prompts, 1):
-                    with st.spinner(f'正在生成第 {i} 张图片...'):
-                        try:
-                            output = replicate.run(
-                                "black-forest-labs/flux-schnell",
-                                input={
-                                    "prompt": prompt,
-                                    "go_fast": True,
-                                    "num_outputs": 1,
-                                    "aspect_ratio": "16:9",
-                                    "output_format": "webp",
-                                    "output_quality": 90
-                                }
-                            )
-                            
-                            # 下载图片
-                            response = requests.get(output[0])
-                            img = Image.open(BytesIO(response.content))
-                            
-                            # 将16:9的图片裁剪成2.35:1，并调整为900x383
-                            current_ratio = img.width / img.height
-                            target_ratio = 2.35
-                            
-                            if current_ratio < target_ratio:
-                                # 需要裁剪高度
-                                new_height = int(img.width / target_ratio)
-                                crop_top = (img.height - new_height) // 2
-                                img = img.crop((0, crop_top, img.width, crop_top + new_height))
-                            else:
-                                # 需要裁剪宽度
-                                new_width = int(img.height * target_ratio)
-                                crop_left = (img.width - new_width) // 2
-                                img = img.crop((crop_left, 0, crop_left + new_width, img.height))
-                            
-                            # 调整到目标尺寸
-                            img = img.resize((900, 383), Image.Resampling.LANCZOS)
-                            
-                            st.write("调试信息:")
-                            st.write(f"预览画布尺寸: {preview_width}x{preview_height}")
-                            st.write(f"裁剪后图片尺寸: {img.size}")
-                            
-                            # 根据用户设置处理logo
-                            if uploaded_logo:
-                                logo_img = Image.open(uploaded_logo)
-                                # 如果是RGBA模式，裁剪掉透明边缘
-                                if logo_img.mode == 'RGBA':
-                                    alpha = logo_img.split()[3]
-                                    bbox = alpha.getbbox()
-                                    if bbox:
-                                        logo_img = logo_img.crop(bbox)
-                                
-                                # 直接使用百分比计算实际尺寸
-                                target_width = int(img.width * logo_size / 100)
-                                aspect_ratio = logo_img.width / logo_img.height
-                                target_height = int(target_width / aspect_ratio)
-                                
-                                # 调整logo大小
-                                logo_img = logo_img.resize((target_width, target_height), Image.Resampling.LANCZOS)
-                                
-                                # 计算实际位置
-                                x = int((img.width - target_width) * x_pos / 100)
-                                y = int((img.height - target_height) * y_pos / 100)
-                                
-                                # 处理透明度
-                                if logo_img.mode == 'RGBA':
-                                    logo_with_opacity = logo_img.copy()
-                                    if opacity < 100:
-                                        alpha = logo_with_opacity.split()[3]
-                                        alpha = alpha.point(lambda x: int(x * opacity / 100))
-                                        logo_with_opacity.putalpha(alpha)
-                                else:
-                                    logo_with_opacity = logo_img.convert('RGBA')
-                                    if opacity < 100:
-                                        alpha = Image.new('L', logo_img.size, int(255 * opacity / 100))
-                                        logo_with_opacity.putalpha(alpha)
-                                
-                                # 合成图片
-                                img = img.convert('RGBA')
-                                img.paste(logo_with_opacity, (x, y), logo_with_opacity)
-                                img = img.convert('RGB')
-                            
-                            images.append(img)
-                            st.success(f"✅ 第 {i} 张图片生成成功")
-                        except Exception as e:
-                            st.error(f"生成第 {i} 张图片时出错: {str(e)}")
-                
-                # 4. 显示结果
-                if images:
-                    st.success("✅ 所有封面生成成功")
-                    
-                    # 显示图片并添加下载按钮
-                    cols = st.columns(len(images))
-                    for idx, (col, img) in enumerate(zip(cols, images)):
-                        # 显示图片
-                        col.image(img, caption=f"封面 {idx+1}", use_container_width=True)
-                        
-                        # 将图片转换为 base64
-                        import base64
-                        from io import BytesIO
-                        
-                        buffered = BytesIO()
-                        img.save(buffered, format="PNG")
-                        img_str = base64.b64encode(buffered.getvalue()).decode()
-                        
-                        # 创建下载链接
-                        href = f"""
-                        <a href="data:image/png;base64,{img_str}" 
-                           download="cover_{idx+1}.png" 
-                           style="text-decoration: none; width: 100%; display: block; text-align: center;">
-                            <button style="
-                                background-color: #4CAF50;
-                                border: none;
-                                color: white;
-                                padding: 8px 16px;
-                                text-align: center;
-                                text-decoration: none;
-                                display: inline-block;
-                                font-size: 14px;
-                                margin: 4px 2px;
-                                cursor: pointer;
-                                border-radius: 4px;
-                                transition: background-color 0.3s;
-                                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                                width: 80%;">
-                                下载封面 {idx+1}
-                            </button>
-                        </a>
-                        """
-                        col.markdown(href, unsafe_allow_html=True)
-                    
-                    # 添加全部下载按钮
-                    st.markdown("<br>", unsafe_allow_html=True)  # 添加间距
-                    
-                    # 创建ZIP文件
-                    import zipfile
-                    zip_buffer = BytesIO()
-                    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-                        for idx, img in enumerate(images, 1):
-                            img_byte_arr = BytesIO()
-                            img.save(img_byte_arr, format='PNG')
-                            img_byte_arr = img_byte_arr.getvalue()
-                            zip_file.writestr(f'cover_{idx}.png', img_byte_arr)
-                    
-                    # 将ZIP文件转换为base64
-                    zip_str = base64.b64encode(zip_buffer.getvalue()).decode()
-                    
-                    # 创建全部下载按钮
-                    all_download_href = f"""
-                    <div style="text-align: center;">
-                        <a href="data:application/zip;base64,{zip_str}" 
-                           download="all_covers.zip" 
-                           style="text-decoration: none;">
-                            <button style="
-                                background-color: #2196F3;
-                                border: none;
-                                color: white;
-                                padding: 12px 24px;
-                                text-align: center;
-                                text-decoration: none;
-                                display: inline-block;
-                                font-size: 16px;
-                                margin: 8px 2px;
-                                cursor: pointer;
-                                border-radius: 4px;
-                                transition: background-color 0.3s;
-                                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                                width: 200px;">
-                                下载全部封面
-                            </button>
-                        </a>
-                    </div>
-                    """
-                    st.markdown(all_download_href, unsafe_allow_html=True)
-                    
-            except Exception as e:
-                st.error(f"发生错误: {str(e)}")
-                st.error("错误类型: " + str(type(e))) 
\ No newline at end of file
+        # 提交后台任务，任务 ID 写入链接，页面刷新后仍能找回结果
+        params = {
+            'regenerate': regenerate,
+            'priority': user_id in rate_limiter.whitelist,
+            'format': output_format,
+            'max_bytes': SIZE_LIMITS[size_limit],
+        }
+        if reuse_similar:
+            params.update(prompts=similar.prompts, similar_to=similar.digest)
+        logo = None
+        if uploaded_logo:
+            logo = uploaded_logo.getvalue()
+            params.update(x_pos=x_pos, y_pos=y_pos, size_percent=logo_size, opacity=opacity)
+        st.query_params['job'] = job_queue.submit(user_id, article_text, params, logo)
+
+if 'job' in st.query_params:
+    show_job(st.query_params['job'])
@@ -1,15 +1,31 @@
-import requests
-from bs4 import BeautifulSoup
 import re
-from openai import OpenAI
-from config import DEEPSEEK_API_KEY
+import time
+import codecs
+from urllib.parse import urlparse
+from config import ARTICLE_MAX_BYTES, ARTICLE_FETCH_DEADLINE, ARTICLE_MIN_BODY_BYTES, LOCAL_EXTRACT_MIN_CONFIDENCE
+from http_clients import get_article_session, get_deepseek_client, HTTP_TIMEOUT
+from selector_registry import get_selector_registry
+
+try:
+    from charset_normalizer import from_bytes
+except ImportError:
+    from_bytes = None
+
+# 允许解析的内容类型
+HTML_CONTENT_TYPES = {'text/html', 'application/xhtml+xml', 'text/plain'}
+
+# 网页 <meta> 中声明的字符集
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w-]+)', re.IGNORECASE)
+
+# 清理文本：空行（段落）| 其他空白 | 特殊字符，一个正则一次扫描
+CLEAN_TEXT_RE = re.compile(r'([^\S\n]*\n[^\S\n]*(?:\n\s*)+)|(\s+)|([^\w\s\u4e00-\u9fff.,!?，。！？、:：()（）])')
+
+# 不同名称指向同一编码的常见情况，统一用超集解码
+CHARSET_ALIASES = {'gb2312': 'gb18030', 'gbk': 'gb18030', 'iso-8859-1': 'cp1252', 'ascii': 'utf-8'}
 
 def analyze_html_structure(html_content):
     """使用 AI 分析网页结构并返回最可能包含文章内容的选择器"""
-    client = OpenAI(
-        api_key=DEEPSEEK_API_KEY,
-        base_url="https://api.deepseek.com"
-    )
+    client = get_deepseek_client()
     
     system_prompt = """你是一个网页解析专家。分析给定的HTML结构，找出最可能包含主要文章内容的CSS选择器。
     返回格式要求：
@@ -32,54 +48,154 @@ def analyze_html_structure(html_content):
     except:
         return None
 
+def _normalize_charset(name):
+    """规范化字符集名称，无法识别时返回 None"""
+    if not name:
+        return None
+    name = name.strip().strip('"\'').lower()
+    name = CHARSET_ALIASES.get(name, name)
+    try:
+        codecs.lookup(name)
+    except LookupError:
+        return None
+    return name
+
+def detect_charset(raw, content_type=''):
+    """
+    在解码前确定网页的字符集
+    优先级: 响应头 > 网页 <meta> 声明 > 内容检测 > utf-8
+    """
+    match = re.search(r'charset\s*=\s*([^\s;]+)', content_type, re.IGNORECASE)
+    charset = _normalize_charset(match.group(1)) if match else None
+    if charset:
+        return charset
+    
+    # meta 标签通常在前 4KB 以内
+    match = META_CHARSET_RE.search(raw[:4096])
+    charset = _normalize_charset(match.group(1).decode('ascii', 'ignore')) if match else None
+    if charset:
+        return charset
+    
+    if from_bytes is not None:
+        best = from_bytes(raw[:65536]).best()
+        charset = _normalize_charset(best.encoding) if best else None
+        if charset:
+            return charset
+    
+    return 'utf-8'
+
+def download_html(url, max_bytes=ARTICLE_MAX_BYTES, deadline=ARTICLE_FETCH_DEADLINE):
+    """
+    流式下载网页并解码
+    - 连接和读取分别超时，整体下载时间不超过 deadline 秒
+    - 只接受 HTML 类内容，最多读取 max_bytes 字节
+    - 读到 </body>，或读完一个足够长的 <article> 后立即停止
+    """
+    start = time.monotonic()
+    # 共享会话已带上浏览器请求头，并对同一站点保持长连接
+    with get_article_session().get(url, timeout=HTTP_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        
+        content_type = response.headers.get('Content-Type', '')
+        mime = content_type.split(';')[0].strip().lower()
+        if mime and mime not in HTML_CONTENT_TYPES:
+            raise ValueError(f"不支持的内容类型: {mime}")
+        
+        content_length = response.headers.get('Content-Length')
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            print(f"网页大小 {content_length} 字节超过上限，只读取前 {max_bytes} 字节")
+        
+        buffer = bytearray()
+        article_start = -1
+        for chunk in response.iter_content(chunk_size=16384):
+            # 与上一块的结尾重叠一点，避免标签被切断
+            search_from = max(0, len(buffer) - 16)
+            buffer.extend(chunk)
+            window = bytes(buffer[search_from:]).lower()
+            
+            if len(buffer) >= max_bytes:
+                del buffer[max_bytes:]
+                break
+            if time.monotonic() - start > deadline:
+                raise TimeoutError(f"下载网页超过 {deadline:.0f} 秒")
+            
+            if b'</body' in window:
+                break
+            if article_start < 0:
+                pos = window.find(b'<article')
+                if pos >= 0:
+                    article_start = search_from + pos
+            if article_start >= 0:
+                pos = window.find(b'</article')
+                if pos >= 0 and search_from + pos - article_start >= ARTICLE_MIN_BODY_BYTES:
+                    break
+    
+    raw = bytes(buffer)
+    return raw.decode(detect_charset(raw, content_type), errors='replace')
+
+# 常见的正文选择器
+COMMON_SELECTORS = [
+    'article', '.post-content', '.article-content',
+    '.entry-content', '.article-body', '.post-body'
+]
+
 def fetch_article(url):
     """从网页链接获取文章内容"""
+    # bs4/lxml 只在真正抓取网页时才导入，只用 clean_text 的页面不需要加载
+    from content_extractor import ParsedPage
+
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-        }
+        html = download_html(url)
+        host = urlparse(url).hostname or ''
+        selector_registry = get_selector_registry()
         
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
+        # 只解析一次，所有候选选择器在同一次遍历中完成匹配
+        learned_selectors = selector_registry.candidates(host)
+        common_selectors = [s for s in COMMON_SELECTORS if s not in learned_selectors]
+        page = ParsedPage(html, learned_selectors + common_selectors)
         
-        soup = BeautifulSoup(response.text, 'html.parser')
+        # 0. 先尝试该站点之前成功过的选择器
+        for selector in learned_selectors:
+            if page.select_text(selector) is not None:
+                selector_registry.record_hit(host, selector)
+                return clean_text(page.article_text(page.select(selector)))
+            selector_registry.record_miss(host, selector)
         
-        # 1. 首先尝试常见的选择器
-        common_selectors = [
-            'article', '.post-content', '.article-content',
-            '.entry-content', '.article-body', '.post-body'
-        ]
+        # 1. 然后尝试常见的选择器（确保内容足够长）
+        selector, text = page.first_match(common_selectors)
+        if text is not None:
+            selector_registry.record_hit(host, selector, source='common')
+            return clean_text(page.article_text(page.select(selector)))
         
-        for selector in common_selectors:
-            content = soup.select_one(selector)
-            if content and len(content.get_text().strip()) > 200:  # 确保内容足够长
-                return clean_text(content.get_text())
+        # 2. 本地按文本密度和链接密度识别正文
+        element, confidence = page.extract_main()
+        if element is not None and confidence >= LOCAL_EXTRACT_MIN_CONFIDENCE:
+            selector = page.selector_for(element)
+            if selector:
+                selector_registry.record_hit(host, selector, source='local')
+            return clean_text(page.article_text(element))
         
-        # 2. 如果常见选择器失败，使用AI分析
-        print("自动获取失败，开始使用AI分析网页结构")
-        ai_selector = analyze_html_structure(response.text)
+        # 3. 本地识别把握不大时，才使用AI分析
+        print(f"本地识别置信度较低（{confidence:.2f}），开始使用AI分析网页结构")
+        ai_selector = analyze_html_structure(html)
         if ai_selector:
-            content = soup.select_one(ai_selector)
-            if content and len(content.get_text().strip()) > 200:
-                return clean_text(content.get_text())
-        
-        # 3. 后备方案：获取所有段落
-        paragraphs = soup.find_all('p')
-        text = '\n\n'.join(p.get_text() for p in paragraphs if len(p.get_text().strip()) > 20)
+            if page.select_text(ai_selector) is not None:
+                selector_registry.record_hit(host, ai_selector, source='ai')
+                return clean_text(page.article_text(page.select(ai_selector)))
         
-        return clean_text(text)
+        # 4. 后备方案：获取所有段落
+        return clean_text(page.paragraph_text())
         
     except Exception as e:
         raise Exception(f"获取文章失败: {str(e)}")
 
+def _clean_match(match):
+    if match.group(1) is not None:
+        return '\n\n'  # 空行分隔的段落
+    if match.group(2) is not None:
+        return ' '  # 其他空白字符合并为一个空格
+    return ''  # 特殊字符直接移除
+
 def clean_text(text):
-    """清理和格式化文本"""
-    # 移除多余的空白字符
-    text = re.sub(r'\s+', ' ', text)
-    # 规范化段落
-    text = re.sub(r'\n\s*\n', '\n\n', text)
-    # 移除特殊字符
-    text = re.sub(r'[^\w\s\u4e00-\u9fff.,!?，。！？、:：()（）\n]', '', text)
-    return text.strip() 
\ No newline at end of file
+    """清理和格式化文本，单次扫描完成：保留段落，合并多余空白，移除特殊字符"""
+    return CLEAN_TEXT_RE.sub(_clean_match, text).strip()
@@ -0,0 +1,334 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import queue
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+
+from config import (
+    LOGO_PATH, BATCH_OUTPUT_DIR, BATCH_FETCH_WORKERS, BATCH_PROMPT_WORKERS,
+    BATCH_GENERATE_WORKERS, BATCH_COMPOSITE_WORKERS, PROMPT_BATCH_SIZE, PROMPT_BATCH_MAX_WAIT
+)
+from article_fetcher import fetch_article, clean_text
+from utils import generate_prompts, generate_prompts_batch, generated_count, PROMPT_COUNT
+from compositor import combine_images_batch
+from image_pipeline import CoverPipeline
+from image_generator import generate_images
+
+# 每个阶段的名称，依次执行
+STAGES = ('fetch', 'prompt', 'generate', 'composite')
+
+
+def load_items(path: str) -> List[Dict]:
+    """
+    读取批量任务
+    - .jsonl 文件：每行一个对象，包含 url 或 text，可选 id
+    - 其他文件：每行一个文章链接
+    """
+    items = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if path.endswith('.jsonl'):
+                try:
+                    item = json.loads(line)
+                except ValueError as e:
+                    print(f"第 {line_no} 行不是有效的 JSON，已跳过: {str(e)}")
+                    continue
+                if not isinstance(item, dict) or (not item.get('url') and not item.get('text')):
+                    print(f"第 {line_no} 行缺少 url 或 text，已跳过")
+                    continue
+            else:
+                item = {'url': line}
+            source = item.get('url') or item['text']
+            item.setdefault('id', hashlib.sha1(source.encode('utf-8')).hexdigest()[:12])
+            items.append(item)
+    return items
+
+
+class PromptBatcher:
+    def __init__(self, batch_size: int = PROMPT_BATCH_SIZE, max_wait: float = PROMPT_BATCH_MAX_WAIT,
+                 max_concurrent: int = 1):
+        """
+        把各篇文章的提示词请求凑成批，用一次模型调用生成多篇文章的提示词
+        :param batch_size: 每批最多包含的文章数
+        :param max_wait: 凑批时最多等待的秒数，超时后不满一批也会发出
+        :param max_concurrent: 同时进行的批量请求数
+        """
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='prompt-batch')
+        self.requests = 0
+        self.collector = threading.Thread(target=self._collect, name='prompt-batcher', daemon=True)
+        self.collector.start()
+
+    def submit(self, article_text: str) -> Future:
+        """提交一篇文章，返回提示词的 Future"""
+        future = Future()
+        self.queue.put((article_text, future))
+        return future
+
+    def close(self):
+        """发出剩余的请求并等待全部完成"""
+        self.queue.put(None)
+        self.collector.join()
+        self.executor.shutdown(wait=True)
+
+    def _collect(self):
+        closed = False
+        while not closed:
+            first = self.queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    closed = True
+                    break
+                batch.append(item)
+            self.requests += 1
+            self.executor.submit(self._run, batch)
+
+    def _run(self, batch):
+        try:
+            results = generate_prompts_batch([article for article, _ in batch], batch_size=self.batch_size)
+            for (_, future), prompts in zip(batch, results):
+                future.set_result(prompts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+
+
+class BatchRunner:
+    def __init__(self, output_dir: str = BATCH_OUTPUT_DIR, stage_limits: Dict[str, int] = None,
+                 prompt_batch_size: int = PROMPT_BATCH_SIZE):
+        """
+        批量生成封面：抓取 → 提示词 → 生成图片 → 合成，每个阶段单独限制并发
+        每篇文章输出到单独的目录，进度记录在 manifest.jsonl 中，中断后重新运行会跳过已完成的文章。
+        :param output_dir: 输出目录
+        :param stage_limits: 各阶段同时处理的文章数
+        :param prompt_batch_size: 每次模型调用包含的文章数，为 1 时逐篇生成
+        """
+        self.output_dir = output_dir
+        self.stage_limits = {
+            'fetch': BATCH_FETCH_WORKERS,
+            'prompt': BATCH_PROMPT_WORKERS,
+            'generate': BATCH_GENERATE_WORKERS,
+            'composite': BATCH_COMPOSITE_WORKERS,
+            **(stage_limits or {})
+        }
+        self.semaphores = {stage: threading.BoundedSemaphore(limit) for stage, limit in self.stage_limits.items()}
+        self.manifest_path = os.path.join(output_dir, 'manifest.jsonl')
+        self.manifest_lock = threading.Lock()
+        self.stage_seconds = {stage: 0.0 for stage in STAGES}
+        self.prompt_batch_size = prompt_batch_size
+        self.prompt_batcher = None
+        self.pipeline = CoverPipeline()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def load_manifest(self) -> Dict[str, Dict]:
+        """读取已有的进度记录，同一篇文章以最后一条为准"""
+        records = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # 中断时可能写了半行
+                    records[record['id']] = record
+        return records
+
+    def record(self, record: Dict):
+        """追加一条进度记录"""
+        with self.manifest_lock:
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def run(self, items: List[Dict]) -> Dict:
+        """运行批量任务，返回统计信息"""
+        finished = {
+            item_id for item_id, record in self.load_manifest().items()
+            if record.get('status') == 'done' and all(os.path.exists(p) for p in record.get('covers', []))
+        }
+        pending = [item for item in items if item['id'] not in finished]
+        print(f"共 {len(items)} 篇文章，已完成 {len(items) - len(pending)} 篇，本次处理 {len(pending)} 篇")
+
+        if self.prompt_batch_size > 1:
+            # 批量模式下提示词阶段的并发数即同时进行的批量请求数
+            self.prompt_batcher = PromptBatcher(self.prompt_batch_size,
+                                                max_concurrent=self.stage_limits['prompt'])
+
+        start = time.monotonic()
+        counts = {'done': 0, 'partial': 0, 'failed': 0}
+        counts_lock = threading.Lock()
+
+        def process(item):
+            status = self.process_item(item)
+            with counts_lock:
+                counts[status] += 1
+                done = sum(counts.values())
+            label = {'done': '完成', 'partial': '部分完成', 'failed': '失败'}[status]
+            print(f"[{done}/{len(pending)}] {item['id']} {label}")
+
+        # 每个阶段都由信号量限流，线程数只需要保证各阶段能同时跑满
+        with ThreadPoolExecutor(max_workers=max(1, sum(self.stage_limits.values())),
+                                thread_name_prefix='batch') as executor:
+            list(executor.map(process, pending))
+        if self.prompt_batcher is not None:
+            self.prompt_batcher.close()
+
+        elapsed = time.monotonic() - start
+        processed = sum(counts.values())
+        stats = {
+            **counts,
+            'skipped': len(items) - len(pending),
+            'elapsed': elapsed,
+            'articles_per_minute': counts['done'] / elapsed * 60 if elapsed else 0.0,
+            'prompt_requests': self.prompt_batcher.requests if self.prompt_batcher else None,
+            'stage_seconds': {
+                stage: seconds / processed if processed else 0.0
+                for stage, seconds in self.stage_seconds.items()
+            }
+        }
+        return stats
+
+    def process_item(self, item: Dict) -> str:
+        """依次执行各阶段，中间结果保存在文章目录中，重跑时直接复用"""
+        article_dir = os.path.join(self.output_dir, item['id'])
+        os.makedirs(article_dir, exist_ok=True)
+        stage = 'fetch'
+        try:
+            article_path = os.path.join(article_dir, 'article.txt')
+            with self._stage(stage):
+                if os.path.exists(article_path):
+                    with open(article_path, 'r', encoding='utf-8') as f:
+                        article_text = f.read()
+                else:
+                    article_text = fetch_article(item['url']) if item.get('url') else clean_text(item['text'])
+                    self._write_text(article_path, article_text)
+
+            stage = 'prompt'
+            prompts_path = os.path.join(article_dir, 'prompts.json')
+            if os.path.exists(prompts_path):
+                with open(prompts_path, 'r', encoding='utf-8') as f:
+                    prompts = json.load(f)
+            else:
+                if self.prompt_batcher is not None:
+                    # 凑批时不占用阶段名额，并发由批量请求数限制
+                    start = time.monotonic()
+                    prompts = self.prompt_batcher.submit(article_text).result()
+                    with self.manifest_lock:
+                        self.stage_seconds[stage] += time.monotonic() - start
+                else:
+                    with self._stage(stage):
+                        prompts = generate_prompts(article_text)
+                # 模型调用失败时拿到的是补齐的默认提示词，不保存，记为失败，重新运行时再生成
+                generated = generated_count(prompts)
+                if generated < PROMPT_COUNT:
+                    raise RuntimeError(f"模型只生成了 {generated} 个提示词")
+                self._write_text(prompts_path, json.dumps(prompts, ensure_ascii=False))
+
+            stage = 'generate'
+            with self._stage(stage):
+                # 批量任务在本进程的准入控制中共用一个用户；命令行单独运行时与在线服务的准入控制互不相通，
+                # 不会为在线用户让出名额，对上游的并发只由 --generate-workers 限制
+                results = generate_images(prompts, user_id='batch')
+            images = [(result.index, result.data) for result in results if result.ok]
+            errors = [f"第 {result.index + 1} 张: {result.error}" for result in results if not result.ok]
+            if not images:
+                raise RuntimeError('; '.join(errors))
+
+            stage = 'composite'
+            covers = []
+            with self._stage(stage):
+                # 解码时直接裁剪缩放到封面尺寸，几张封面再一次合成 logo
+                decoded = [self.pipeline.decode(data) for _, data in images]
+                combined = combine_images_batch(decoded, LOGO_PATH)
+                for (index, _), img in zip(images, combined):
+                    output_path = os.path.join(article_dir, f"cover_{index + 1}.png")
+                    img.save(output_path)
+                    covers.append(output_path)
+
+            # 部分图片失败时记为 partial，重新运行时会重试缺少的封面（已生成的命中图片缓存）
+            status = 'partial' if errors else 'done'
+            self.record({'id': item['id'], 'status': status, 'covers': covers, 'errors': errors,
+                         'source': item.get('url') or 'text'})
+            return status
+
+        except Exception as e:
+            self.record({'id': item['id'], 'status': 'failed', 'stage': stage, 'error': str(e),
+                         'source': item.get('url') or 'text'})
+            return 'failed'
+
+    @contextmanager
+    def _stage(self, stage):
+        """获取阶段的并发名额，并统计耗时"""
+        with self.semaphores[stage]:
+            start = time.monotonic()
+            try:
+                yield
+            finally:
+                with self.manifest_lock:
+                    self.stage_seconds[stage] += time.monotonic() - start
+
+    @staticmethod
+    def _write_text(path, text):
+        """先写临时文件再替换，避免中断后留下不完整的中间结果"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量生成公众号封面")
+    parser.add_argument('input', help="文章列表：每行一个链接，或 .jsonl（每行包含 url 或 text）")
+    parser.add_argument('--output-dir', default=BATCH_OUTPUT_DIR, help="输出目录，每篇文章一个子目录")
+    parser.add_argument('--fetch-workers', type=int, default=BATCH_FETCH_WORKERS)
+    parser.add_argument('--prompt-workers', type=int, default=BATCH_PROMPT_WORKERS)
+    parser.add_argument('--generate-workers', type=int, default=BATCH_GENERATE_WORKERS)
+    parser.add_argument('--composite-workers', type=int, default=BATCH_COMPOSITE_WORKERS)
+    parser.add_argument('--prompt-batch-size', type=int, default=PROMPT_BATCH_SIZE,
+                        help="每次模型调用生成多少篇文章的提示词，1 表示逐篇生成")
+    args = parser.parse_args(argv)
+
+    runner = BatchRunner(args.output_dir, {
+        'fetch': args.fetch_workers,
+        'prompt': args.prompt_workers,
+        'generate': args.generate_workers,
+        'composite': args.composite_workers
+    }, prompt_batch_size=args.prompt_batch_size)
+    stats = runner.run(load_items(args.input))
+
+    print(f"\n完成 {stats['done']} 篇，部分完成 {stats['partial']} 篇，失败 {stats['failed']} 篇，"
+          f"跳过 {stats['skipped']} 篇")
+    print(f"耗时 {stats['elapsed']:.1f} 秒，吞吐量 {stats['articles_per_minute']:.1f} 篇/分钟")
+    if stats['prompt_requests'] is not None:
+        print(f"提示词批量请求 {stats['prompt_requests']} 次")
+    print("各阶段平均耗时: " + '，'.join(
+        f"{stage} {seconds:.2f}s" for stage, seconds in stats['stage_seconds'].items()))
+    print(f"进度记录: {runner.manifest_path}")
+    return 0 if stats['failed'] == 0 and stats['partial'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
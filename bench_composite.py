@@ -0,0 +1,62 @@
+import time
+
+import numpy as np
+from PIL import Image, ImageChops
+
+from config import LOGO_PATH
+from utils import combine_images, logo_cache
+from compositor import combine_images_batch, composite_batch
+
+
+def legacy_combine(cover_img, logo_img, x_pos=90, y_pos=90, size_percent=15, opacity=100):
+    """之前的实现：每张图都重新缩放 logo，并在 RGBA 画布上合成后再转回 RGB"""
+    cover_img = cover_img.convert('RGBA')
+    logo_img = logo_img.convert('RGBA')
+    target_width = int(cover_img.width * (size_percent / 100))
+    target_height = int(target_width / (logo_img.width / logo_img.height))
+    logo_img = logo_img.resize((target_width, target_height), Image.Resampling.LANCZOS)
+    x = int((cover_img.width - target_width) * x_pos / 100)
+    y = int((cover_img.height - target_height) * y_pos / 100)
+    final_img = Image.new('RGBA', cover_img.size)
+    final_img.paste(cover_img, (0, 0))
+    final_img.paste(logo_img, (x, y), logo_img)
+    return final_img.convert('RGB')
+
+
+def images_per_second(func, count, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+def bench_composite(count=100, size=(1344, 768)):
+    rng = np.random.default_rng(0)
+    arrays = rng.integers(0, 256, (count, size[1], size[0], 3), dtype=np.uint8)
+    covers = [Image.fromarray(a) for a in arrays]
+    logo = Image.open(LOGO_PATH)
+    logo.load()
+
+    # 结果必须与逐张 combine_images 一致（批量版本会直接修改传入的封面，这里传副本）
+    expected = [combine_images(img, LOGO_PATH, opacity=70) for img in covers[:5]]
+    actual = combine_images_batch([img.copy() for img in covers[:5]], LOGO_PATH, opacity=70)
+    identical = all(ImageChops.difference(a, b).getbbox() is None for a, b in zip(expected, actual))
+
+    prepared = logo_cache.prepare(LOGO_PATH, int(size[0] * 0.15))
+    results = [
+        ('原实现（每张缩放logo）', images_per_second(lambda: [legacy_combine(img, logo) for img in covers], count, 1)),
+        ('combine_images 逐张', images_per_second(lambda: [combine_images(img, LOGO_PATH) for img in covers], count)),
+        ('combine_images_batch', images_per_second(lambda: combine_images_batch(covers, LOGO_PATH), count)),
+        ('composite_batch（数组输入）', images_per_second(lambda: composite_batch(arrays, prepared), count)),
+    ]
+
+    print(f"{count} 张 {size[0]}x{size[1]} 封面，结果与 combine_images 一致: {'是' if identical else '否'}")
+    print(f"{'实现':<28}{'张/秒':>12}")
+    for name, rate in results:
+        print(f"{name:<28}{rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    bench_composite()
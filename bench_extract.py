@@ -0,0 +1,108 @@
+import os
+import glob
+import json
+import time
+
+from bs4 import BeautifulSoup
+
+from content_extractor import ParsedPage, HTML_PARSER
+from article_fetcher import COMMON_SELECTORS
+from config import LOCAL_EXTRACT_MIN_CONFIDENCE
+
+# 离线样本页面。目前的样本都是仿照常见站点结构人工生成的（manifest.json 中 source 为 generated），
+# 不是保存下来的真实网页，准确率只能说明识别逻辑在这些结构上可用；
+# 保存真实网页后按 source 为 saved 加入 manifest.json，结果会分开统计。
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'samples', 'pages')
+
+
+def legacy_extract(html):
+    """原来的提取方式：完整解析，逐个选择器全文查找，每个元素计算两次文本"""
+    soup = BeautifulSoup(html, 'html.parser')
+    for selector in COMMON_SELECTORS:
+        content = soup.select_one(selector)
+        if content and len(content.get_text().strip()) > 200:
+            return content.get_text()
+    paragraphs = soup.find_all('p')
+    return '\n\n'.join(p.get_text() for p in paragraphs if len(p.get_text().strip()) > 20)
+
+
+def single_pass_extract(html):
+    """新的提取方式：部分解析，一次遍历匹配所有选择器"""
+    page = ParsedPage(html, COMMON_SELECTORS)
+    _, text = page.first_match(COMMON_SELECTORS)
+    return text if text is not None else page.paragraph_text()
+
+
+def timeit(func, html, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(html)
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def bench_extract(repeat=20):
+    print(f"解析器: {HTML_PARSER}，每个页面重复 {repeat} 次")
+    print(f"{'页面':<34}{'原方式(ms)':>12}{'新方式(ms)':>12}{'加速':>8}  结果一致")
+    total_old = total_new = 0
+    for path in sorted(glob.glob(os.path.join(SAMPLES_DIR, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        old_ms, old_text = timeit(legacy_extract, html, repeat)
+        new_ms, new_text = timeit(single_pass_extract, html, repeat)
+        total_old += old_ms
+        total_new += new_ms
+        same = ' '.join(old_text.split()) == ' '.join(new_text.split())
+        print(f"{os.path.basename(path):<34}{old_ms:>12.2f}{new_ms:>12.2f}{old_ms / new_ms:>7.1f}x  {'是' if same else '否'}")
+    print(f"{'合计':<34}{total_old:>12.2f}{total_new:>12.2f}{total_old / total_new:>7.1f}x")
+
+
+def bench_local_extractor():
+    """
+    在离线样本上评估本地正文识别
+    正文样本要求识别出的文本包含首尾片段；没有正文的页面要求置信度低于阈值（交给AI）
+    人工生成的样本和保存的真实网页分开统计
+    """
+    with open(os.path.join(SAMPLES_DIR, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    print(f"\n本地正文识别，置信度阈值 {LOCAL_EXTRACT_MIN_CONFIDENCE}")
+    print(f"{'页面':<34}{'置信度':>8}{'耗时(ms)':>10}  {'需要AI':<6}结果")
+    correct = needs_llm = 0
+    correct_by_source = {}
+    latencies = []
+    for sample in manifest:
+        with open(os.path.join(SAMPLES_DIR, sample['file']), encoding='utf-8') as f:
+            html = f.read()
+
+        start = time.perf_counter()
+        page = ParsedPage(html)
+        element, confidence = page.extract_main()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        accepted = element is not None and confidence >= LOCAL_EXTRACT_MIN_CONFIDENCE
+        text = ' '.join(page.text(element).split()) if accepted else ''
+        if sample['start'] is None:
+            ok = not accepted
+        else:
+            ok = accepted and sample['start'] in text and sample['end'] in text
+        correct += ok
+        needs_llm += not accepted
+        source = sample.get('source', 'generated')
+        hits, count = correct_by_source.get(source, (0, 0))
+        correct_by_source[source] = (hits + ok, count + 1)
+        print(f"{sample['file']:<34}{confidence:>8.2f}{latencies[-1]:>10.2f}  {'是' if not accepted else '否':<6}{'正确' if ok else '错误'}")
+
+    total = len(manifest)
+    print(f"准确率: {correct}/{total} ({correct / total:.0%})，"
+          f"需要调用AI: {needs_llm}/{total}，"
+          f"平均耗时: {sum(latencies) / total:.2f}ms，最长: {max(latencies):.2f}ms")
+    names = {'generated': '人工生成的样本', 'saved': '保存的真实网页'}
+    for source, (hits, count) in sorted(correct_by_source.items()):
+        print(f"  {names.get(source, source)}: {hits}/{count}")
+    if 'saved' not in correct_by_source:
+        print("  注意：没有保存的真实网页样本，以上结果不代表真实网页上的准确率")
+
+
+if __name__ == "__main__":
+    bench_extract()
+    bench_local_extractor()
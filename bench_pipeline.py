@@ -0,0 +1,120 @@
+import io
+import os
+import sys
+import time
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+from PIL import Image
+
+
+# 测试用的小 logo，避免解码原 logo 的内存掩盖图片处理本身的峰值
+LOGO_SIZE = (400, 170)
+
+# 测试图片：Flux 原始输出尺寸、放大后的 WebP、大尺寸 JPEG
+SAMPLES = [
+    ('flux_1344x768.webp', (1344, 768), 'WEBP'),
+    ('large_2688x1536.webp', (2688, 1536), 'WEBP'),
+    ('photo_4096x2304.jpg', (4096, 2304), 'JPEG'),
+]
+
+
+def make_sample(path, size, format):
+    """带渐变和噪声的测试图片"""
+    width, height = size
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    noise = np.random.default_rng(0).integers(0, 32, (height, width), dtype=np.uint8)
+    pixels = np.stack([(x + y) / 2 + noise, np.broadcast_to(x, (height, width)), y + noise * 0], axis=-1)
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, format=format, quality=90)
+
+
+def make_logo():
+    return Image.new('RGBA', LOGO_SIZE, (255, 255, 255, 200))
+
+
+def legacy_process(data, logo_img):
+    """原来 app.py 的处理方式：完整解码，先裁剪再缩放，转 RGBA 合成后转回 RGB"""
+    from utils import logo_cache
+    from image_pipeline import crop_to_cover
+    img = crop_to_cover(Image.open(io.BytesIO(data)))
+    logo = logo_cache.prepare(logo_img, int(img.width * 0.15))
+    img = img.convert('RGBA')
+    x = int((img.width - logo.width) * 0.9)
+    y = int((img.height - logo.height) * 0.9)
+    img.paste(logo, (x, y), logo)
+    return img.convert('RGB')
+
+
+def pipeline_process(data, logo_img):
+    from image_pipeline import CoverPipeline
+    return CoverPipeline(logo=logo_img).process(data)
+
+
+def memory_kb():
+    """(当前内存, 峰值内存) KB；Linux 上读取 /proc，其他系统只有 ru_maxrss"""
+    try:
+        with open('/proc/self/status') as f:
+            fields = dict(line.split(':', 1) for line in f)
+        return int(fields['VmRSS'].split()[0]), int(fields['VmHWM'].split()[0])
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak, peak
+
+
+def reset_peak():
+    """把峰值内存重置为当前值，导入模块时的临时占用不计入（Linux）"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def child(method, path, repeat=5):
+    """在独立进程中运行，报告峰值内存增量和平均耗时"""
+    func = legacy_process if method == 'legacy' else pipeline_process
+    with open(path, 'rb') as f:
+        data = f.read()
+    # 先处理好 logo，两种方式都不计入
+    from utils import logo_cache
+    import image_pipeline  # noqa: F401
+    logo_img = make_logo()
+    logo_cache.prepare(logo_img, 135)
+
+    reset_peak()
+    baseline, _ = memory_kb()
+    func(data, logo_img)
+    peak = memory_kb()[1] - baseline
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(data, logo_img)
+    elapsed = (time.perf_counter() - start) / repeat * 1000
+    print(f"{peak} {elapsed:.2f}")
+
+
+def bench_pipeline():
+    print(f"{'图片':<24}{'原方式峰值(MB)':>16}{'流水线峰值(MB)':>16}{'原方式(ms)':>12}{'流水线(ms)':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, size, format in SAMPLES:
+            path = os.path.join(tmp, name)
+            make_sample(path, size, format)
+            row = {}
+            for method in ('legacy', 'pipeline'):
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--child', method, path],
+                    capture_output=True, text=True, check=True
+                ).stdout.split()
+                row[method] = (int(output[0]) / 1024, float(output[1]))
+            print(f"{name:<24}{row['legacy'][0]:>16.1f}{row['pipeline'][0]:>16.1f}"
+                  f"{row['legacy'][1]:>12.1f}{row['pipeline'][1]:>12.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3])
+    else:
+        bench_pipeline()
@@ -0,0 +1,54 @@
+import os
+import time
+import random
+import tempfile
+from datetime import datetime
+
+from rate_limiter import RateLimiter, SQLiteStore, JSONFileStore
+
+
+def populate_sqlite(path, users, now):
+    """预先写入 users 个处于有效窗口内的用户"""
+    store = SQLiteStore(path)
+    conn = store._connect()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO usage (user_id, count, window_start, expires_at) VALUES (?, 1, ?, ?)",
+        ((f"user_{i}", now, now + 24 * 3600) for i in range(users))
+    )
+    conn.execute("COMMIT")
+    return store
+
+
+def populate_json(path, users, now):
+    store = JSONFileStore(path)
+    last_reset = datetime.fromtimestamp(now).isoformat()
+    store.usage_data = {f"user_{i}": {'count': 1, 'last_reset': last_reset} for i in range(users)}
+    store.save_data()
+    return store
+
+
+def checks_per_second(limiter, users, checks):
+    """随机用户调用 check_rate_limit，返回每秒检查次数"""
+    ids = [f"user_{random.randrange(users * 2)}" for _ in range(checks)]
+    start = time.perf_counter()
+    for user_id in ids:
+        limiter.check_rate_limit(user_id)
+    return checks / (time.perf_counter() - start)
+
+
+def bench_rate_limiter(user_counts=(10_000, 50_000, 100_000), sqlite_checks=20_000, json_checks=200):
+    print(f"{'用户数':>10}{'SQLite(次/秒)':>16}{'JSON(次/秒)':>14}{'加速':>10}")
+    for users in user_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            now = time.time()
+            sqlite_store = populate_sqlite(os.path.join(tmp, 'usage.db'), users, now)
+            json_store = populate_json(os.path.join(tmp, 'usage.json'), users, now)
+
+            sqlite_rate = checks_per_second(RateLimiter(limit=3, store=sqlite_store), users, sqlite_checks)
+            json_rate = checks_per_second(RateLimiter(limit=3, store=json_store), users, json_checks)
+            print(f"{users:>10}{sqlite_rate:>16.0f}{json_rate:>14.0f}{sqlite_rate / json_rate:>9.0f}x")
+
+
+if __name__ == "__main__":
+    bench_rate_limiter()
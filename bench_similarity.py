@@ -0,0 +1,65 @@
+import os
+import time
+import random
+import tempfile
+
+from article_fetcher import clean_text
+from similarity_index import SimilarityIndex, simhash
+
+# 用常用汉字随机拼出测试文章
+CHARS = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经'
+
+
+def make_article(length=1500):
+    text = ''.join(random.choice(CHARS) for _ in range(length))
+    return '\n'.join(text[i:i + 120] for i in range(0, length, 120))
+
+
+def light_edit(article):
+    """改标题、加尾注、少量错别字"""
+    body = ''.join(c if random.random() > 0.01 else random.choice(CHARS) for c in article)
+    return '转载｜' + body + '\n本文转载自其他公众号，如有侵权请联系删除。'
+
+
+def populate(path, entries):
+    """预先写入 entries 篇随机指纹的文章"""
+    index = SimilarityIndex(path)
+    conn = index._connect()
+    now = time.time()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO articles (digest, fingerprint, title, prompts, last_used) VALUES (?, ?, '', '[]', ?)",
+        ((f"article_{i}", f"{random.getrandbits(64):016x}", now) for i in range(entries))
+    )
+    conn.execute("COMMIT")
+
+
+def bench_similarity(entry_counts=(1_000, 10_000, 50_000), lookups=2_000):
+    random.seed(0)
+    articles = [clean_text(make_article()) for _ in range(20)]
+    edited = [clean_text(light_edit(article)) for article in articles]
+
+    start = time.perf_counter()
+    fingerprints = [simhash(article) for article in edited]
+    print(f"计算指纹: {(time.perf_counter() - start) / len(edited) * 1000:.2f}ms/篇（1500字）")
+
+    print(f"{'条目数':>10}{'载入(秒)':>10}{'查找(微秒)':>12}{'命中率':>8}")
+    for entries in entry_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'similar.db')
+            populate(path, entries)
+            start = time.perf_counter()
+            index = SimilarityIndex(path, max_entries=entries + len(articles))
+            load_time = time.perf_counter() - start
+            for article in articles:
+                index.add(article, ['p1', 'p2', 'p3'])
+
+            start = time.perf_counter()
+            hits = sum(index.lookup_fingerprint(fingerprints[i % len(fingerprints)]) is not None
+                       for i in range(lookups))
+            lookup_time = (time.perf_counter() - start) / lookups
+            print(f"{entries:>10}{load_time:>10.2f}{lookup_time * 1e6:>12.1f}{hits / lookups:>8.0%}")
+
+
+if __name__ == "__main__":
+    bench_similarity()
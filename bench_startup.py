@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+# 生成封面时才需要的重量级模块，启动和普通重新运行时不应加载
+HEAVY_MODULES = ('openai', 'replicate', 'httpx', 'requests', 'bs4', 'lxml')
+
+
+def child(reruns):
+    """在全新进程中运行页面：首次运行（冷启动）和之后的重新运行"""
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.run()
+    cold = time.perf_counter() - start
+
+    timings = []
+    for index in range(reruns):
+        # 模拟编辑文章时的重新运行
+        at.text_area[0].input(f"测试文章 {index}")
+        start = time.perf_counter()
+        at.run()
+        timings.append(time.perf_counter() - start)
+
+    print(json.dumps({
+        'cold': cold,
+        'rerun_median': statistics.median(timings),
+        'rerun_p95': sorted(timings)[int(len(timings) * 0.95)],
+        'heavy_modules': [name for name in HEAVY_MODULES if name in sys.modules],
+        'errors': [str(e.value) for e in at.exception],
+    }))
+
+
+def bench_startup(runs=3, reruns=20):
+    print(f"页面: {APP_PATH}，冷启动 {runs} 次，每次之后重新运行 {reruns} 次")
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', str(reruns)],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(APP_PATH)
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    for result in results:
+        if result['errors']:
+            print(f"页面出错: {result['errors']}")
+    print(f"冷启动（导入 + 首次运行）: {statistics.median(r['cold'] for r in results) * 1000:.0f}ms")
+    print(f"重新运行中位数: {statistics.median(r['rerun_median'] for r in results) * 1000:.1f}ms，"
+          f"P95: {statistics.median(r['rerun_p95'] for r in results) * 1000:.1f}ms")
+    print(f"启动后已加载的重量级模块: {', '.join(results[0]['heavy_modules']) or '无'}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == '--child':
+        child(int(sys.argv[2]))
+    else:
+        bench_startup()
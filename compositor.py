@@ -0,0 +1,83 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from utils import logo_cache
+
+
+def logo_region(cover_size, logo_size, x_pos=90, y_pos=90) -> Optional[Tuple[Tuple, Tuple]]:
+    """
+    logo 在封面上覆盖的区域，位置计算与 utils.paste_logo 相同，超出封面的部分裁掉
+    :return: (封面上的区域, logo 上对应的区域)，均为 (左, 上, 右, 下)；没有重叠时返回 None
+    """
+    x = int((cover_size[0] - logo_size[0]) * x_pos / 100)
+    y = int((cover_size[1] - logo_size[1]) * y_pos / 100)
+    left, top = max(0, x), max(0, y)
+    right, bottom = min(cover_size[0], x + logo_size[0]), min(cover_size[1], y + logo_size[1])
+    if left >= right or top >= bottom:
+        return None
+    return (left, top, right, bottom), (left - x, top - y, right - x, bottom - y)
+
+
+def blend(regions: np.ndarray, logo: np.ndarray) -> np.ndarray:
+    """
+    把 RGBA logo 混合到一组同尺寸的 RGB 区域上（直接修改 regions）
+    舍入方式与 Pillow 的 paste 相同，结果逐像素一致。
+    :param regions: 形状为 (张数, 高, 宽, 3) 的 uint8 数组
+    :param logo: 形状为 (高, 宽, 4) 的 uint8 数组
+    """
+    pixels = logo.astype(np.uint16)
+    alpha = pixels[..., 3:4]
+    # 预先算好 logo * alpha + 128，每张封面只剩一次乘加；最大 255 * 255 + 128，不会溢出 uint16
+    logo_term = pixels[..., :3] * alpha + 128
+    inverse = 255 - alpha
+
+    blended = regions.astype(np.uint16)
+    blended *= inverse
+    blended += logo_term
+    # 与 Pillow 的 DIV255 相同：(t + (t >> 8)) >> 8
+    blended += blended >> 8
+    blended >>= 8
+    regions[...] = blended
+    return regions
+
+
+def composite_batch(covers: np.ndarray, logo: Image.Image, x_pos=90, y_pos=90) -> np.ndarray:
+    """
+    把处理好的 RGBA logo 一次性合成到一组同尺寸封面上（直接修改 covers），只计算 logo 覆盖的区域
+    :param covers: 形状为 (张数, 高, 宽, 3) 的 uint8 数组
+    :param logo: logo_cache.prepare 返回的 RGBA logo
+    """
+    region = logo_region((covers.shape[2], covers.shape[1]), logo.size, x_pos, y_pos)
+    if region is None:
+        return covers
+    (left, top, right, bottom), logo_box = region
+    blend(covers[:, top:bottom, left:right], np.asarray(logo.crop(logo_box)))
+    return covers
+
+
+def combine_images_batch(cover_imgs: List[Image.Image], logo_img, x_pos=90, y_pos=90,
+                         size_percent=15, opacity=100, trim=False) -> List[Image.Image]:
+    """
+    批量版本的 combine_images，同一个 logo 合成到多张封面上，参数含义与 combine_images 相同
+    尺寸相同的封面只取出 logo 区域一起做一次数组运算，再贴回原图，不复制整张画布。
+    RGB 封面会被直接修改并返回，其他模式的封面先转换为 RGB。
+    """
+    results = [img if img.mode == 'RGB' else img.convert('RGB') for img in cover_imgs]
+    groups = {}
+    for index, img in enumerate(results):
+        groups.setdefault(img.size, []).append(index)
+
+    for size, indexes in groups.items():
+        logo = logo_cache.prepare(logo_img, int(size[0] * (size_percent / 100)), opacity, trim=trim)
+        region = logo_region(size, logo.size, x_pos, y_pos)
+        if region is None:
+            continue
+        cover_box, logo_box = region
+
+        regions = np.stack([np.asarray(results[index].crop(cover_box)) for index in indexes])
+        blend(regions, np.asarray(logo.crop(logo_box)))
+        for row, index in enumerate(indexes):
+            results[index].paste(Image.fromarray(regions[row]), cover_box[:2])
+    return results
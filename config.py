@@ -12,9 +12,84 @@ ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 REPLICATE_API_TOKEN = os.getenv('REPLICATE_API_TOKEN')
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
 
+# 网络连接配置
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))  # 每个连接池保持的连接数
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+DEEPSEEK_TIMEOUT = float(os.getenv('DEEPSEEK_TIMEOUT', '60'))  # 模型生成较慢，读超时单独配置
+
 # 路径配置
 LOGO_PATH = os.path.join(ROOT_DIR, 'static', 'images', 'huoshuiai_logo.png')
 OUTPUT_DIR = os.path.join(ROOT_DIR, 'output')
+CACHE_DIR = os.path.join(ROOT_DIR, 'cache')
+
+# 提示词缓存配置
+PROMPT_CACHE_DIR = os.path.join(CACHE_DIR, 'prompts')
+PROMPT_CACHE_MEMORY_ITEMS = int(os.getenv('PROMPT_CACHE_MEMORY_ITEMS', '256'))  # 内存中最多缓存的条目数
+PROMPT_CACHE_DISK_BYTES = int(os.getenv('PROMPT_CACHE_DISK_BYTES', str(20 * 1024 * 1024)))  # 磁盘缓存上限
+
+# 提示词生成配置
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '1200'))  # 发给模型的文章摘要 token 上限
+PROMPT_BATCH_SIZE = int(os.getenv('PROMPT_BATCH_SIZE', '10'))  # 批量模式下一次请求包含的文章数
+PROMPT_BATCH_TOKEN_BUDGET = int(os.getenv('PROMPT_BATCH_TOKEN_BUDGET', '400'))  # 批量模式下每篇文章摘要的 token 上限
+PROMPT_BATCH_MAX_WAIT = float(os.getenv('PROMPT_BATCH_MAX_WAIT', '2'))  # 凑批最多等待秒数
+PROMPT_BATCH_OUTPUT_TOKENS = int(os.getenv('PROMPT_BATCH_OUTPUT_TOKENS', '800'))  # 批量模式下每篇文章预留的输出 token 数
+DEEPSEEK_MAX_OUTPUT_TOKENS = int(os.getenv('DEEPSEEK_MAX_OUTPUT_TOKENS', '8192'))  # 模型单次回复的 token 上限
+
+# 文章抓取配置
+SELECTOR_REGISTRY_PATH = os.path.join(CACHE_DIR, 'selectors.db')  # 各站点学习到的选择器
+SELECTOR_MAX_MISSES = int(os.getenv('SELECTOR_MAX_MISSES', '3'))  # 连续失败多少次后移除选择器
+SELECTOR_TTL_DAYS = int(os.getenv('SELECTOR_TTL_DAYS', '30'))  # 多少天未命中后过期
+ARTICLE_MAX_BYTES = int(os.getenv('ARTICLE_MAX_BYTES', str(5 * 1024 * 1024)))  # 单个网页最多读取的字节数
+ARTICLE_FETCH_DEADLINE = float(os.getenv('ARTICLE_FETCH_DEADLINE', '20'))  # 下载单个网页的总时限（秒）
+ARTICLE_MIN_BODY_BYTES = int(os.getenv('ARTICLE_MIN_BODY_BYTES', '2000'))  # <article> 至少这么大才提前停止读取
+LOCAL_EXTRACT_MIN_CONFIDENCE = float(os.getenv('LOCAL_EXTRACT_MIN_CONFIDENCE', '0.5'))  # 本地正文识别低于该置信度时才调用AI
+
+# 图片生成配置
+IMAGE_MODEL = "black-forest-labs/flux-schnell"
+IMAGE_MAX_WORKERS = int(os.getenv('IMAGE_MAX_WORKERS', '3'))  # 同时进行的生成任务数
+IMAGE_JOB_TIMEOUT = float(os.getenv('IMAGE_JOB_TIMEOUT', '120'))  # 单个任务超时秒数
+IMAGE_POLL_INTERVAL = float(os.getenv('IMAGE_POLL_INTERVAL', '0.5'))  # 查询预测状态的间隔秒数
+IMAGE_CACHE_DIR = os.path.join(CACHE_DIR, 'images')
+IMAGE_CACHE_BYTES = int(os.getenv('IMAGE_CACHE_BYTES', str(500 * 1024 * 1024)))  # 图片缓存上限
+
+LOGO_CACHE_ITEMS = int(os.getenv('LOGO_CACHE_ITEMS', '32'))  # 处理好的 Logo 最多缓存的数量
+
+# 封面输出配置：按公众号素材限制搜索 JPEG/WebP 的压缩质量
+WECHAT_IMAGE_MAX_BYTES = int(os.getenv('WECHAT_IMAGE_MAX_BYTES', str(10 * 1024 * 1024)))  # 图片素材上限
+WECHAT_THUMB_MAX_BYTES = int(os.getenv('WECHAT_THUMB_MAX_BYTES', str(64 * 1024)))  # 缩略图素材上限
+
+# 生成结果存储：所有任务共享的内存上限，超出后转存到临时目录
+RESULT_STORE_MEMORY_BYTES = int(os.getenv('RESULT_STORE_MEMORY_BYTES', str(64 * 1024 * 1024)))
+RESULT_STORE_TTL = float(os.getenv('RESULT_STORE_TTL', '3600'))  # 任务的结果多少秒未访问后从内存和临时目录清理
+
+# 图片生成准入控制：整个进程同时进行的预测数和排队设置
+ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', '6'))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '300'))  # 最长排队秒数
+ADMISSION_INITIAL_SERVICE_TIME = float(os.getenv('ADMISSION_INITIAL_SERVICE_TIME', '10'))  # 估算等待时间用的初始单次耗时
+
+# 后台生成任务：页面提交任务后由工作线程执行，状态和结果保存在 SQLite 中
+JOB_DB_PATH = os.path.join(CACHE_DIR, 'jobs.db')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))  # 同时执行的任务数
+JOB_RETENTION = float(os.getenv('JOB_RETENTION', str(3 * 24 * 3600)))  # 结束的任务保留秒数
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))  # 页面刷新任务进度的间隔秒数
+JOB_LEASE = float(os.getenv('JOB_LEASE', '60'))  # 执行中任务的租约秒数，进程退出后超过这个时间才会被其他进程接手
+
+# 相似文章索引：转载或轻微修改的文章复用之前的提示词和图片
+SIMILARITY_INDEX_PATH = os.path.join(CACHE_DIR, 'similar_articles.db')
+SIMILARITY_MAX_DISTANCE = int(os.getenv('SIMILARITY_MAX_DISTANCE', '8'))  # 64 位指纹最多相差几位视为相似
+SIMILARITY_MIN_CHARS = int(os.getenv('SIMILARITY_MIN_CHARS', '100'))  # 太短的文章不参与比较
+SIMILARITY_INDEX_MAX_ENTRIES = int(os.getenv('SIMILARITY_INDEX_MAX_ENTRIES', '10000'))
+SIMILARITY_INDEX_TTL_DAYS = int(os.getenv('SIMILARITY_INDEX_TTL_DAYS', '30'))  # 多少天未使用后过期
+
+# 批量生成配置：各阶段同时处理的文章数
+BATCH_OUTPUT_DIR = os.path.join(OUTPUT_DIR, 'batch')
+BATCH_FETCH_WORKERS = int(os.getenv('BATCH_FETCH_WORKERS', '8'))
+BATCH_PROMPT_WORKERS = int(os.getenv('BATCH_PROMPT_WORKERS', '4'))
+BATCH_GENERATE_WORKERS = int(os.getenv('BATCH_GENERATE_WORKERS', '2'))
+BATCH_COMPOSITE_WORKERS = int(os.getenv('BATCH_COMPOSITE_WORKERS', '2'))
 
 # 认证配置
 AUTH_CONFIG_PATH = os.path.join(ROOT_DIR, 'auth_config.yaml')
@@ -0,0 +1,5 @@
+import os
+
+# 测试不访问网络，只需要通过配置检查
+for name in ('REPLICATE_API_TOKEN', 'DEEPSEEK_API_KEY', 'AUTH_SECRET_KEY'):
+    os.environ.setdefault(name, 'test')
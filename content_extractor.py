@@ -0,0 +1,260 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, CData, NavigableString, SoupStrainer, Tag
+
+# 优先使用更快的 lxml 解析器，未安装时退回内置解析器
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# 只保留可能包含正文的元素（连同其中的所有子元素），<head> 中的脚本样式、导航等顶层元素直接跳过；
+# html、body 等外层元素和不在这些元素内的 ul、span 等不在解析结果中
+CONTENT_TAGS = [
+    'title', 'article', 'main', 'section', 'div', 'p', 'td',
+    'blockquote', 'pre', 'figure', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'
+]
+
+# 解析前直接去掉的内容：脚本、样式、注释等不会出现在正文里，也最占解析时间
+NOISE_RE = re.compile(
+    r'<(script|style|noscript|svg|template)\b[^>]*>.*?</\1\s*>|<!--.*?-->',
+    re.IGNORECASE | re.DOTALL
+)
+
+# 类名/ID 中常见的正文与非正文特征，用于本地正文识别
+POSITIVE_HINTS_RE = re.compile(r'article|content|post|entry|text|body|main|rich_media|story|msg', re.IGNORECASE)
+NEGATIVE_HINTS_RE = re.compile(
+    r'comment|discuss|footer|nav|sidebar|menu|share|meta|related|widget|recommend|'
+    r'header|toolbar|tool|qr_code|banner|ad-|ads', re.IGNORECASE
+)
+
+# 按段落统计文本的元素；div/section/td 内还有其他块元素时只统计直接包含的文字
+PARAGRAPH_TAGS = {'p', 'pre', 'blockquote'}
+TEXT_BLOCK_TAGS = ['p', 'pre', 'blockquote', 'div', 'section', 'td']
+
+# 段落得分分给上面各层容器的比例
+ANCESTOR_WEIGHTS = (1.0, 0.5, 1 / 3)
+
+# 提取正文时在这些元素前断开段落
+BREAK_TAGS = {
+    'p', 'div', 'section', 'article', 'br', 'li', 'pre', 'blockquote', 'figure',
+    'table', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'
+}
+
+# 中英文逗号句号，数量越多越像正文
+PUNCTUATION_RE = re.compile(r'[，。,！？；]')
+
+# 可以在遍历时直接匹配的简单选择器: tag / .class / #id 及其组合
+SIMPLE_SELECTOR_RE = re.compile(r'^([a-zA-Z][\w-]*)?((?:[.#][\w-]+)*)$')
+
+
+class SimpleSelector:
+    def __init__(self, selector: str, tag: Optional[str], ids: List[str], classes: List[str]):
+        self.selector = selector
+        self.tag = tag
+        self.ids = ids
+        self.classes = classes
+
+    @classmethod
+    def compile(cls, selector: str) -> Optional['SimpleSelector']:
+        """解析简单选择器，复杂选择器返回 None"""
+        match = SIMPLE_SELECTOR_RE.match(selector.strip())
+        if not match or not selector.strip():
+            return None
+        tag, rest = match.groups()
+        parts = re.findall(r'([.#])([\w-]+)', rest)
+        ids = [name for kind, name in parts if kind == '#']
+        classes = [name for kind, name in parts if kind == '.']
+        return cls(selector, tag.lower() if tag else None, ids, classes)
+
+    def matches(self, element: Tag) -> bool:
+        if self.tag and element.name != self.tag:
+            return False
+        if self.ids and element.get('id') not in self.ids:
+            return False
+        if self.classes:
+            element_classes = element.get('class') or []
+            if not all(name in element_classes for name in self.classes):
+                return False
+        return True
+
+
+class ParsedPage:
+    def __init__(self, html: str, selectors: List[str] = ()):
+        """
+        只解析一次网页，并在一次遍历中完成所有候选选择器的匹配
+        :param html: 网页内容
+        :param selectors: 候选选择器，按优先级排列
+        """
+        self.html = NOISE_RE.sub('', html)
+        self.soup = BeautifulSoup(self.html, HTML_PARSER, parse_only=SoupStrainer(CONTENT_TAGS))
+        self.full_soup: Optional[BeautifulSoup] = None  # 完整解析，只在需要时创建
+        self.selectors = list(selectors)
+        self.matches: Dict[str, Optional[Tag]] = {}
+        self.paragraphs: List[Tag] = []
+        self._texts: Dict[int, str] = {}
+        self._scan()
+
+    def _scan(self):
+        """一次遍历：记录每个简单选择器的第一个匹配元素，同时收集所有段落"""
+        pending = []
+        for selector in self.selectors:
+            compiled = SimpleSelector.compile(selector)
+            if compiled is None or self._needs_full_tree(selector):
+                continue
+            self.matches[selector] = None
+            pending.append(compiled)
+
+        for element in self.soup.find_all(True):
+            if element.name == 'p':
+                self.paragraphs.append(element)
+            if not pending:
+                continue
+            for compiled in list(pending):
+                if compiled.matches(element):
+                    self.matches[compiled.selector] = element
+                    pending.remove(compiled)
+
+    def text(self, element: Tag) -> str:
+        """元素的文本，每个元素只计算一次"""
+        key = id(element)
+        if key not in self._texts:
+            self._texts[key] = element.get_text()
+        return self._texts[key]
+
+    def article_text(self, element: Tag) -> str:
+        """元素的正文文本，块级元素之间用空行分隔，保留段落结构"""
+        parts = []
+        for node in element.descendants:
+            if isinstance(node, Tag):
+                if node.name in BREAK_TAGS:
+                    parts.append('\n\n')
+            elif type(node) in (NavigableString, CData):
+                parts.append(node)
+        return ''.join(parts)
+
+    def select(self, selector: str) -> Optional[Tag]:
+        """
+        返回选择器匹配的第一个元素，复杂选择器交给 soupsieve 处理
+        可能依赖被跳过的元素的选择器（如 body > div.rich_media、ul.post-list）在精简的解析结果中
+        找不到时，再在完整解析的网页中查找
+        """
+        if selector not in self.matches:
+            element = self._select_one(self.soup, selector)
+            if element is None and self._needs_full_tree(selector):
+                if self.full_soup is None:
+                    self.full_soup = BeautifulSoup(self.html, HTML_PARSER)
+                element = self._select_one(self.full_soup, selector)
+            self.matches[selector] = element
+        return self.matches[selector]
+
+    @staticmethod
+    def _select_one(soup: BeautifulSoup, selector: str) -> Optional[Tag]:
+        try:
+            return soup.select_one(selector)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _needs_full_tree(selector: str) -> bool:
+        """
+        选择器是否可能匹配到精简解析时跳过的元素：复杂选择器（组合、属性、伪类等），
+        或指定了 CONTENT_TAGS 以外的标签；只有类名/ID 的选择器匹配的元素几乎总在正文元素内，不重新解析
+        """
+        compiled = SimpleSelector.compile(selector)
+        return compiled is None or (compiled.tag is not None and compiled.tag not in CONTENT_TAGS)
+
+    def select_text(self, selector: str, min_length: int = 200) -> Optional[str]:
+        """选择器匹配元素的文本，内容不足 min_length 时返回 None"""
+        element = self.select(selector)
+        if element is None:
+            return None
+        text = self.text(element)
+        return text if len(text.strip()) > min_length else None
+
+    def first_match(self, selectors: List[str], min_length: int = 200):
+        """按顺序尝试选择器，返回 (选择器, 文本)；都不满足时返回 (None, None)"""
+        for selector in selectors:
+            text = self.select_text(selector, min_length)
+            if text is not None:
+                return selector, text
+        return None, None
+
+    def paragraph_text(self, min_length: int = 20) -> str:
+        """后备方案：拼接所有足够长的段落"""
+        texts = (self.text(p) for p in self.paragraphs)
+        return '\n\n'.join(text for text in texts if len(text.strip()) > min_length)
+
+    def extract_main(self) -> Tuple[Optional[Tag], float]:
+        """
+        本地正文识别（类似 readability 的文本密度 + 链接密度打分）
+        :return: (最可能的正文元素, 置信度 0-1)
+        """
+        candidates: Dict[int, List] = {}
+        total_length = 0
+
+        for element in self.soup.find_all(TEXT_BLOCK_TAGS):
+            if element.name in PARAGRAPH_TAGS or element.find(TEXT_BLOCK_TAGS) is None:
+                text = self.text(element)
+            else:
+                text = ''.join(element.find_all(string=True, recursive=False))
+            text = text.strip()
+            if len(text) < 25:
+                continue
+            total_length += len(text)
+
+            # 段落得分：标点越多、越长越像正文，按层级递减分给上面三层容器
+            score = 1 + len(PUNCTUATION_RE.findall(text)) + min(len(text) // 100, 3)
+            node = element if element.name not in PARAGRAPH_TAGS else element.parent
+            for weight in ANCESTOR_WEIGHTS:
+                if node is None or node is self.soup:
+                    break
+                entry = candidates.setdefault(id(node), [node, self._hint_weight(node)])
+                entry[1] += score * weight
+                node = node.parent
+
+        best, best_score = None, 0.0
+        for node, score in candidates.values():
+            score *= 1 - self.link_density(node)
+            if score > best_score:
+                best, best_score = node, score
+
+        if best is None or not total_length:
+            return None, 0.0
+
+        text_length = len(self.text(best).strip())
+        length_factor = min(1.0, text_length / 250)
+        link_factor = max(0.0, 1 - 2 * self.link_density(best))
+        share = min(1.0, text_length / total_length)
+        return best, length_factor * link_factor * (0.5 + 0.5 * share)
+
+    @staticmethod
+    def selector_for(element: Tag) -> Optional[str]:
+        """为识别出的正文元素生成可复用的选择器，没有 id 和类名时返回 None"""
+        if element.get('id'):
+            return f"#{element['id']}"
+        classes = element.get('class') or []
+        if classes:
+            return f"{element.name}.{classes[0]}"
+        return None
+
+    def link_density(self, element: Tag) -> float:
+        """链接文字占元素文字的比例"""
+        text_length = len(self.text(element).strip())
+        if not text_length:
+            return 1.0
+        link_length = sum(len(self.text(a).strip()) for a in element.find_all('a'))
+        return min(1.0, link_length / text_length)
+
+    @staticmethod
+    def _hint_weight(element: Tag) -> float:
+        """根据类名和ID给出初始加减分"""
+        hints = ' '.join(element.get('class') or []) + ' ' + (element.get('id') or '')
+        weight = 0.0
+        if POSITIVE_HINTS_RE.search(hints):
+            weight += 25
+        if NEGATIVE_HINTS_RE.search(hints):
+            weight -= 25
+        return weight
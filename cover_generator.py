@@ -1,46 +1,31 @@
 import os
-import replicate
-import requests
-from PIL import Image
-import io
+import sys
 from config import *
-from utils import generate_prompts, combine_images
+from utils import stream_prompts
+from image_pipeline import CoverPipeline
+from image_generator import generate_images
 from article_fetcher import fetch_article
+from batch_generator import main as batch_main
 
 class CoverGenerator:
     def __init__(self):
         pass
         
     def generate_cover_images(self, article_text):
-        # 1. 生成提示词
-        prompts = generate_prompts(article_text)
-        
-        # 2. 为每个提示词生成图片
-        generated_images = []
-        for prompt in prompts:
-            output = replicate.run(
-                "black-forest-labs/flux-schnell",
-                input={
-                    "prompt": prompt,
-                    "go_fast": True,
-                    "num_outputs": 4,
-                    "aspect_ratio": "16:9",  # 目前模型只支持16:9
-                    "output_format": "webp",
-                    "output_quality": 100
-                }
-            )
-            
-            # 下载生成的图片
-            response = requests.get(output[0])
-            img = Image.open(io.BytesIO(response.content))
-            generated_images.append(img)
+        # 1. 流式生成提示词，2. 每个提示词一到就并发生成图片
+        prompts = stream_prompts(article_text)
+        results = generate_images(prompts, num_outputs=4, output_quality=100)
             
-        # 3. 与logo合成
+        # 3. 裁剪到封面尺寸并与logo合成
+        pipeline = CoverPipeline(logo=LOGO_PATH)
         final_covers = []
-        for idx, img in enumerate(generated_images):
-            output_path = os.path.join(OUTPUT_DIR, f"cover_{idx+1}.png")
-            combined_img = combine_images(img, LOGO_PATH)
-            combined_img.save(output_path)
+        for result in results:
+            if not result.ok:
+                print(f"生成第 {result.index + 1} 张图片失败: {result.error}")
+                continue
+            output_path = os.path.join(OUTPUT_DIR, f"cover_{result.index+1}.png")
+            with open(output_path, 'wb') as f:
+                f.write(pipeline.process_to_bytes(result.data))
             final_covers.append(output_path)
             
         return final_covers
@@ -60,6 +45,10 @@ class CoverGenerator:
             return []
 
 def main():
+    # 带参数运行时进入批量模式: python cover_generator.py urls.txt
+    if len(sys.argv) > 1:
+        return batch_main(sys.argv[1:])
+    
     # 创建输出目录
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     
@@ -75,4 +64,4 @@ def main():
         print("封面生成失败")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main()) 
\ No newline at end of file
@@ -0,0 +1,28 @@
+import time
+import sqlite3
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    打开 SQLite 数据库：WAL 模式、自动提交，多个线程和进程可以同时读写
+    :param path: 数据库文件路径
+    """
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    enable_wal(conn)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def enable_wal(conn: sqlite3.Connection, attempts: int = 50):
+    """
+    切换到 WAL 模式（设置会保存在数据库文件中）
+    切换需要独占锁且不等待 busy_timeout，多个进程同时初始化时重试
+    """
+    for _ in range(attempts):
+        try:
+            if conn.execute("PRAGMA journal_mode").fetchone()[0] != 'wal':
+                conn.execute("PRAGMA journal_mode=WAL")
+            return
+        except sqlite3.OperationalError:
+            time.sleep(0.1)
+    conn.execute("PRAGMA journal_mode=WAL")
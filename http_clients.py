@@ -0,0 +1,110 @@
+import threading
+from typing import TYPE_CHECKING
+
+# requests、httpx、openai、replicate 导入较慢（openai 单独就要半秒以上），
+# 只在第一次创建对应客户端时导入，页面启动和重新运行都不需要加载
+if TYPE_CHECKING:
+    import replicate
+    import requests
+    from openai import OpenAI
+
+from config import (
+    DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL, DEEPSEEK_TIMEOUT, REPLICATE_API_TOKEN,
+    HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_MAX_RETRIES
+)
+
+# requests 的 (连接超时, 读超时)
+HTTP_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+# 抓取文章时使用的浏览器请求头
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+}
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def _get_or_create(name, factory):
+    """整个进程共享同一个客户端，首次使用时创建"""
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def _build_session(pool_size, headers=None):
+    """创建带连接池和重试的 requests 会话"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD'])
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def get_article_session() -> 'requests.Session':
+    """抓取文章用的会话，按站点保持长连接"""
+    return _get_or_create('article', lambda: _build_session(HTTP_POOL_SIZE, BROWSER_HEADERS))
+
+
+def get_download_session() -> 'requests.Session':
+    """下载生成图片（Replicate CDN）用的会话"""
+    return _get_or_create('download', lambda: _build_session(HTTP_POOL_SIZE))
+
+
+def get_deepseek_client() -> 'OpenAI':
+    """DeepSeek API 客户端"""
+    return _get_or_create('deepseek', _build_deepseek_client)
+
+
+def _build_deepseek_client():
+    import httpx
+    from openai import OpenAI
+
+    return OpenAI(
+        api_key=DEEPSEEK_API_KEY,
+        base_url=DEEPSEEK_BASE_URL,
+        max_retries=HTTP_MAX_RETRIES,
+        http_client=httpx.Client(
+            timeout=httpx.Timeout(DEEPSEEK_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE,
+                                max_keepalive_connections=HTTP_POOL_SIZE)
+        )
+    )
+
+
+def get_replicate_client() -> 'replicate.Client':
+    """Replicate API 客户端"""
+    return _get_or_create('replicate', _build_replicate_client)
+
+
+def _build_replicate_client():
+    import httpx
+    import replicate
+
+    return replicate.Client(
+        api_token=REPLICATE_API_TOKEN,
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        transport=httpx.HTTPTransport(
+            retries=HTTP_MAX_RETRIES,
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE,
+                                max_keepalive_connections=HTTP_POOL_SIZE)
+        )
+    )
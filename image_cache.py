@@ -0,0 +1,128 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from typing import Dict, Optional
+
+from config import IMAGE_CACHE_DIR, IMAGE_CACHE_BYTES
+
+
+class ImageCache:
+    def __init__(self, cache_dir: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_BYTES):
+        """
+        按内容寻址的生成图片缓存，保存下载到的原始字节
+        文件先写临时文件再原子替换，多个会话/进程可以同时读取。
+        :param cache_dir: 缓存目录
+        :param max_bytes: 缓存总字节数上限，超出后按最近使用时间淘汰
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def make_key(model: str, prompt: str, params: Dict) -> str:
+        """
+        根据模型和完整的模型输入计算缓存键
+        :param params: 除提示词外传给模型的全部参数（已合并默认值），任何一项不同都是不同的图片
+        """
+        payload = {'model': model, 'prompt': prompt, 'params': params}
+        data = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取缓存的图片字节，不存在时返回 None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # 更新修改时间，淘汰时按最近使用排序
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self.counters['misses'] += 1
+            return None
+
+        with self.lock:
+            self.counters['hits'] += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        """写入图片字节，写满后淘汰最久未使用的文件"""
+        path = self._path(key)
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # 替换文件和容量统计放在同一把锁里，并发写入同一个键时不会重复计算旧文件大小
+            with self.lock:
+                old_size = os.path.getsize(path) if os.path.exists(path) else 0
+                os.replace(tmp_path, path)
+                tmp_path = None
+                self.total_bytes += len(data) - old_size
+                if self.total_bytes > self.max_bytes:
+                    self._evict()
+        except OSError as e:
+            print(f"写入图片缓存失败: {str(e)}")
+        finally:
+            # 写入或替换失败时删除留下的临时文件
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict:
+        """返回命中/未命中计数和当前占用"""
+        with self.lock:
+            return {**self.counters, 'total_bytes': self.total_bytes}
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.bin')
+
+    def _entries(self):
+        """列出缓存文件: (路径, 大小, 最后使用时间)"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.bin'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        """重新统计目录（其他进程也可能写入），按最近使用时间淘汰到上限以内"""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.counters['evictions'] += 1
+            except OSError:
+                pass
+        self.total_bytes = total
+
+
+_lock = threading.Lock()
+_image_cache: Optional[ImageCache] = None
+
+
+def get_image_cache() -> ImageCache:
+    """进程内共享的生成图片缓存，首次使用时创建，导入模块时不会创建缓存目录"""
+    global _image_cache
+    if _image_cache is None:
+        with _lock:
+            if _image_cache is None:
+                _image_cache = ImageCache()
+    return _image_cache
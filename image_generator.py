@@ -0,0 +1,219 @@
+import io
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from PIL import Image
+
+from config import IMAGE_MODEL, IMAGE_MAX_WORKERS, IMAGE_JOB_TIMEOUT, IMAGE_POLL_INTERVAL, HTTP_CONNECT_TIMEOUT
+from http_clients import get_replicate_client, get_download_session
+from image_cache import ImageCache, get_image_cache
+from admission import AdmissionController, QueueStatus, Ticket
+
+# 默认的模型参数，调用方可以按需覆盖
+DEFAULT_IMAGE_PARAMS = {
+    "go_fast": True,
+    "num_outputs": 1,
+    "aspect_ratio": "16:9",  # 目前模型只支持16:9
+    "output_format": "webp",
+    "output_quality": 90
+}
+
+# 进程内共享的准入控制，所有会话的预测都在这里排队
+admission = AdmissionController()
+
+
+@dataclass
+class ImageResult:
+    """单个图片生成任务的结果"""
+    index: int
+    prompt: str
+    data: Optional[bytes] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.data is not None and self.error is None
+
+    @property
+    def image(self) -> Image.Image:
+        """按需解码下载的图片"""
+        return Image.open(io.BytesIO(self.data))
+
+
+def generate_image(prompt: str, timeout: float = IMAGE_JOB_TIMEOUT, use_cache: bool = True,
+                   user_id: Optional[str] = None, priority: bool = False, **params) -> bytes:
+    """调用 Replicate 生成一张图片，返回下载到的原始字节"""
+    data, _ = _generate_image(prompt, timeout=timeout, use_cache=use_cache,
+                              user_id=user_id, priority=priority, **params)
+    return data
+
+
+def _generate_image(prompt, timeout=IMAGE_JOB_TIMEOUT, use_cache=True,
+                    user_id=None, priority=False, on_ticket=None, **params):
+    """
+    生成图片，返回 (原始字节, 是否命中缓存)
+    命中缓存时直接返回，否则先在准入控制中排队，拿到名额后才调用 Replicate；
+    从拿到名额算起超过 timeout 秒时取消预测并抛出 TimeoutError，线程和名额都会释放
+    """
+    params = {**DEFAULT_IMAGE_PARAMS, **params}
+    cache_key = ImageCache.make_key(IMAGE_MODEL, prompt, params)
+    if use_cache:
+        data = get_image_cache().get(cache_key)
+        if data is not None:
+            return data, True
+
+    with admission.admit(user_id, priority=priority, on_ticket=on_ticket):
+        deadline = time.monotonic() + timeout
+        output = _run_prediction(prompt, params, deadline)
+        url = getattr(output[0], 'url', output[0])
+        remaining = max(deadline - time.monotonic(), HTTP_CONNECT_TIMEOUT)
+        response = get_download_session().get(url, timeout=(HTTP_CONNECT_TIMEOUT, remaining))
+        response.raise_for_status()
+
+    get_image_cache().put(cache_key, response.content)
+    return response.content, False
+
+
+def _run_prediction(prompt, params, deadline):
+    """
+    创建预测并轮询到结束，返回模型输出
+    超过 deadline（time.monotonic 时间）时取消预测，Replicate 不再继续计算，调用线程也不会一直阻塞
+    """
+    prediction = get_replicate_client().predictions.create(model=IMAGE_MODEL, input={"prompt": prompt, **params})
+    while prediction.status not in ('succeeded', 'failed', 'canceled'):
+        if time.monotonic() >= deadline:
+            try:
+                prediction.cancel()
+            except Exception as e:
+                print(f"取消预测 {prediction.id} 失败: {str(e)}")
+            raise TimeoutError("生成超时，已取消预测")
+        time.sleep(min(IMAGE_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+        prediction.reload()
+
+    if prediction.status != 'succeeded':
+        raise RuntimeError(f"预测{'已取消' if prediction.status == 'canceled' else '失败'}: {prediction.error}")
+    if not prediction.output:
+        raise RuntimeError("预测没有返回图片")
+    # 单张输出时部分模型直接返回 URL 而不是列表
+    return prediction.output if isinstance(prediction.output, list) else [prediction.output]
+
+
+def iter_images(prompts: Iterable[str],
+                max_workers: int = IMAGE_MAX_WORKERS,
+                timeout: float = IMAGE_JOB_TIMEOUT,
+                user_id: Optional[str] = None,
+                priority: bool = False,
+                on_status: Optional[Callable[[Optional[QueueStatus]], None]] = None,
+                **params) -> Iterator[ImageResult]:
+    """
+    并发生成图片，按完成顺序逐个产出结果
+    :param prompts: 提示词序列，可以是生成器——每取到一个提示词就立即提交任务
+    :param max_workers: 最大并发任务数
+    :param timeout: 单个任务从拿到准入名额算起的超时秒数，排队时间不计入
+    :param user_id: 用户标识，准入控制按用户公平排队
+    :param priority: 是否使用优先队列（白名单用户）
+    :param on_status: 排队情况变化时回调（排在最前的任务的位置和预计等待时间，不再排队时为 None），
+                      在消费这个生成器的线程中调用，可以直接更新界面
+    :param params: 传给模型的其他参数
+    """
+    done = queue.Queue()
+    pending: Dict[int, str] = {}   # 已提交的任务: 序号 -> 提示词
+    started: Dict[int, float] = {}  # 已开始执行的任务: 序号 -> 开始时间
+    tickets: Dict[int, Ticket] = {}  # 需要调用模型的任务在准入控制中的排队凭证
+    feeding_done = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-gen")
+
+    def run(index, prompt):
+        started[index] = time.monotonic()
+        try:
+            data, cached = _generate_image(prompt, timeout=timeout, user_id=user_id, priority=priority,
+                                           on_ticket=lambda ticket: tickets.__setitem__(index, ticket),
+                                           **params)
+            done.put(ImageResult(index, prompt, data=data, elapsed=elapsed(index), cached=cached))
+        except Exception as e:
+            done.put(ImageResult(index, prompt, error=str(e), elapsed=elapsed(index)))
+
+    def job_start(index):
+        """任务开始计时的时间：需要排队的从拿到名额算起，还在排队时返回 None"""
+        ticket = tickets.get(index)
+        if ticket is None:
+            return started[index]
+        return ticket.admitted_at
+
+    def elapsed(index):
+        return time.monotonic() - (job_start(index) or started[index])
+
+    def feed():
+        try:
+            for index, prompt in enumerate(prompts):
+                pending[index] = prompt
+                executor.submit(run, index, prompt)
+        except Exception as e:
+            print(f"读取提示词时出错: {str(e)}")
+        finally:
+            feeding_done.set()
+
+    threading.Thread(target=feed, name="image-gen-feeder", daemon=True).start()
+
+    finished = set()
+    last_status = None
+    try:
+        while not (feeding_done.is_set() and len(finished) >= len(pending)):
+            try:
+                result = done.get(timeout=0.1)
+            except queue.Empty:
+                result = None
+
+            if result is not None:
+                # 已按超时上报过的任务，迟到的结果直接丢弃
+                if result.index not in finished:
+                    finished.add(result.index)
+                    yield result
+                continue
+
+            if on_status is not None:
+                status = _queue_status(tickets, finished)
+                key = status and (status.position, round(status.eta))
+                if key != last_status:
+                    last_status = key
+                    on_status(status)
+
+            # 检查正在执行的任务是否超时，还在排队的不计时
+            now = time.monotonic()
+            for index in list(started):
+                start = job_start(index)
+                if start is None or index in finished:
+                    continue
+                if now - start > timeout:
+                    finished.add(index)
+                    yield ImageResult(index, pending[index],
+                                      error=f"生成超时（超过 {timeout:.0f} 秒）",
+                                      elapsed=now - start)
+    finally:
+        # 不等待卡住的线程，未开始的任务直接取消，还在排队的让出位置
+        executor.shutdown(wait=False, cancel_futures=True)
+        for ticket in list(tickets.values()):
+            admission.cancel(ticket)
+
+
+def _queue_status(tickets: Dict[int, Ticket], finished) -> Optional[QueueStatus]:
+    """还在排队的任务中排在最前的一个的位置"""
+    statuses = [admission.status(ticket) for index, ticket in list(tickets.items()) if index not in finished]
+    statuses = [status for status in statuses if status is not None]
+    return min(statuses, key=lambda status: status.position, default=None)
+
+
+def generate_images(prompts: Iterable[str],
+                    max_workers: int = IMAGE_MAX_WORKERS,
+                    timeout: float = IMAGE_JOB_TIMEOUT,
+                    user_id: Optional[str] = None,
+                    **params) -> List[ImageResult]:
+    """并发生成图片，结果按提示词顺序返回，每个任务单独报告失败"""
+    results = list(iter_images(prompts, max_workers=max_workers, timeout=timeout, user_id=user_id, **params))
+    return sorted(results, key=lambda r: r.index)
@@ -0,0 +1,176 @@
+import io
+import zipfile
+from dataclasses import dataclass
+from typing import Iterable, Optional, Tuple
+
+from PIL import Image
+
+from utils import logo_cache, paste_logo
+
+# 微信公众号封面尺寸（2.35:1）
+COVER_SIZE = (900, 383)
+
+# 可选的输出格式: 格式 -> (MIME 类型, 扩展名)
+OUTPUT_FORMATS = {
+    'PNG': ('image/png', 'png'),
+    'JPEG': ('image/jpeg', 'jpg'),
+    'WEBP': ('image/webp', 'webp'),
+}
+
+# 有损格式按文件大小上限搜索质量时的范围
+MIN_QUALITY = 30
+MAX_QUALITY = 95
+
+# 缩小倍数较大时先按整数倍快速缩小，剩下的不超过这个倍数再用 LANCZOS，画质几乎不变
+REDUCING_GAP = 3.0
+
+
+def cover_box(size: Tuple[int, int], target: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    """
+    居中裁剪到目标比例的区域 (左, 上, 右, 下)
+    原图比目标更窄（更高）时保留全宽、上下对称裁掉多余的高度，否则保留全高、左右对称裁掉多余的宽度；
+    保留部分的边长向下取整，裁掉的部分奇数时多裁下边/右边的一个像素。
+    """
+    width, height = size
+    target_ratio = target[0] / target[1]
+    if width / height < target_ratio:
+        # 需要裁剪高度
+        new_height = int(width / target_ratio)
+        top = (height - new_height) // 2
+        return 0, top, width, top + new_height
+    # 需要裁剪宽度
+    new_width = int(height * target_ratio)
+    left = (width - new_width) // 2
+    return left, 0, left + new_width, height
+
+
+def crop_to_cover(img: Image.Image, size: Tuple[int, int] = COVER_SIZE) -> Image.Image:
+    """
+    先裁剪再缩放的参考实现，完整解码后分两步处理，结果与 CoverPipeline 的一次 resize 基本一致
+    CoverPipeline 更快、占用内存更少，这里保留用于对比和测试
+    """
+    return img.crop(cover_box(img.size, size)).resize(size, Image.Resampling.LANCZOS)
+
+
+class CoverPipeline:
+    def __init__(self, size: Tuple[int, int] = COVER_SIZE, logo=None,
+                 x_pos=90, y_pos=90, size_percent=15, opacity=100, trim=False):
+        """
+        封面后处理流水线：解码 -> 裁剪 -> 缩放 -> 合成 logo -> 编码
+        裁剪和缩放在一次 resize 中完成，不生成裁剪后的中间图片；
+        JPEG 用 draft 模式直接按接近目标的尺寸解码，其他格式先按整数倍快速缩小。
+        :param size: 输出尺寸
+        :param logo: logo 图片、文件路径或上传的文件，None 表示不加 logo
+        其余参数与 utils.combine_images 相同
+        """
+        self.size = size
+        self.logo = logo
+        self.x_pos = x_pos
+        self.y_pos = y_pos
+        self.size_percent = size_percent
+        self.opacity = opacity
+        self.trim = trim
+
+    def decode(self, data: bytes) -> Image.Image:
+        """解码并直接裁剪缩放到输出尺寸的 RGB 图片"""
+        img = Image.open(io.BytesIO(data))
+        box = cover_box(img.size, self.size)
+        if img.format == 'JPEG':
+            # draft 按 1/2、1/4、1/8 缩小解码，保证裁剪区域仍不小于输出尺寸
+            scale = min((box[2] - box[0]) / self.size[0], (box[3] - box[1]) / self.size[1])
+            requested = (int(img.width / scale) + 1, int(img.height / scale) + 1)
+            original_width = img.width
+            img.draft('RGB', requested)
+            if img.width != original_width:
+                box = cover_box(img.size, self.size)
+
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        return img.resize(self.size, Image.Resampling.LANCZOS, box=box, reducing_gap=REDUCING_GAP)
+
+    def composite(self, img: Image.Image) -> Image.Image:
+        """把 logo 直接粘贴到 RGB 封面上（会修改 img）"""
+        if self.logo is None:
+            return img
+        logo = logo_cache.prepare(self.logo, int(img.width * (self.size_percent / 100)), self.opacity, trim=self.trim)
+        return paste_logo(img, logo, self.x_pos, self.y_pos)
+
+    @staticmethod
+    def encode(img: Image.Image, format: str = 'PNG', **options) -> bytes:
+        """编码为图片文件的字节"""
+        buffer = io.BytesIO()
+        img.save(buffer, format=format, **options)
+        return buffer.getvalue()
+
+    def process(self, data: bytes) -> Image.Image:
+        """生成的原始图片字节 -> 加好 logo 的封面"""
+        return self.composite(self.decode(data))
+
+    def process_to_bytes(self, data: bytes, format: str = 'PNG', **options) -> bytes:
+        """生成的原始图片字节 -> 编码好的封面文件"""
+        return self.encode(self.process(data), format=format, **options)
+
+
+@dataclass
+class EncodedCover:
+    """编码好的封面文件"""
+    data: bytes
+    format: str
+    quality: Optional[int] = None  # 有损格式使用的质量，PNG 为 None
+    fits: bool = True  # 是否满足文件大小上限
+
+    @property
+    def mime(self) -> str:
+        return OUTPUT_FORMATS[self.format][0]
+
+    @property
+    def extension(self) -> str:
+        return OUTPUT_FORMATS[self.format][1]
+
+
+def encode_cover(img: Image.Image, format: str = 'PNG', max_bytes: Optional[int] = None) -> EncodedCover:
+    """
+    把封面编码为指定格式，只编码一次供显示和下载共用
+    JPEG/WebP 在 MIN_QUALITY-MAX_QUALITY 之间二分查找不超过 max_bytes 的最高质量；
+    最低质量仍然超出时返回最低质量的结果并标记 fits=False。
+    :param format: PNG、JPEG 或 WEBP
+    :param max_bytes: 文件大小上限，None 表示不限制
+    """
+    format = format.upper()
+    if format == 'PNG':
+        data = CoverPipeline.encode(img, 'PNG')
+        if max_bytes is not None and len(data) > max_bytes:
+            data = CoverPipeline.encode(img, 'PNG', optimize=True)
+        return EncodedCover(data, format, fits=max_bytes is None or len(data) <= max_bytes)
+
+    def encode(quality):
+        return CoverPipeline.encode(img, format, quality=quality)
+
+    best = encode(MAX_QUALITY)
+    if max_bytes is None or len(best) <= max_bytes:
+        return EncodedCover(best, format, MAX_QUALITY)
+
+    # 二分查找满足大小上限的最高质量
+    low, high = MIN_QUALITY, MAX_QUALITY - 1
+    best, best_quality = None, None
+    while low <= high:
+        quality = (low + high) // 2
+        data = encode(quality)
+        if len(data) <= max_bytes:
+            best, best_quality = data, quality
+            low = quality + 1
+        else:
+            high = quality - 1
+
+    if best is None:
+        return EncodedCover(encode(MIN_QUALITY), format, MIN_QUALITY, fits=False)
+    return EncodedCover(best, format, best_quality)
+
+
+def build_zip(covers: Iterable[Tuple[str, bytes]]) -> bytes:
+    """把已经编码好的封面打包，图片本身已压缩，ZIP 中直接存储不再压缩"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as zip_file:
+        for name, data in covers:
+            zip_file.writestr(name, data)
+    return buffer.getvalue()
@@ -0,0 +1,440 @@
+import io
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from config import JOB_DB_PATH, JOB_WORKERS, JOB_RETENTION, JOB_LEASE
+from article_fetcher import clean_text
+from utils import stream_prompts, PROMPT_COUNT, DEFAULT_PROMPTS
+from image_pipeline import CoverPipeline, encode_cover
+from image_generator import iter_images
+from result_store import result_store
+import db_utils
+from singleflight import SingleFlight
+from similarity_index import get_similarity_index
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# 进程内共享：同一篇文章（清理后的内容相同）同时提交的任务只生成一次提示词和图片
+generation_flights = SingleFlight()
+
+
+@dataclass
+class Job:
+    """一个封面生成任务的状态"""
+    id: str
+    user_id: str
+    status: str
+    params: Dict
+    error: Optional[str] = None
+    queue_position: Optional[int] = None  # 图片生成在准入控制中排队时的位置
+    queue_eta: Optional[float] = None
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+
+@dataclass
+class JobCover:
+    """任务中的一张封面，内容单独读取"""
+    index: int
+    prompt: str
+    name: Optional[str] = None
+    caption: Optional[str] = None
+    mime: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class JobStore:
+    def __init__(self, path: str = JOB_DB_PATH):
+        """
+        基于 SQLite (WAL 模式) 的任务存储，保存任务的输入、状态和编码好的封面
+        进程重启后可以恢复未完成的任务，页面也可以按任务 ID 重新读取结果。
+        执行中的任务记录执行者和租约到期时间，多个进程共用同一个数据库时只有租约过期的任务会被接手。
+        :param path: 数据库文件路径
+        """
+        self.path = path
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                article TEXT NOT NULL,
+                params TEXT NOT NULL,
+                logo BLOB,
+                error TEXT,
+                queue_position INTEGER,
+                queue_eta REAL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                owner TEXT,
+                lease_until REAL
+            )
+        """)
+        # 旧版数据库没有租约字段
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (('owner', 'TEXT'), ('lease_until', 'REAL')):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_covers (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                prompt TEXT NOT NULL,
+                name TEXT,
+                caption TEXT,
+                mime TEXT,
+                data BLOB,
+                error TEXT,
+                PRIMARY KEY (job_id, idx)
+            )
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """每个线程使用自己的连接"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = db_utils.connect(self.path)
+            self.local.conn = conn
+        return conn
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def create(self, job_id: str, user_id: str, article: str, params: Dict, logo: Optional[bytes], now: float):
+        self._connect().execute(
+            "INSERT INTO jobs (id, user_id, status, article, params, logo, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, user_id, QUEUED, article, json.dumps(params), logo, now)
+        )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._connect().execute("""
+            SELECT id, user_id, status, params, error, queue_position, queue_eta,
+                   created_at, started_at, finished_at
+            FROM jobs WHERE id = ?
+        """, (job_id,)).fetchone()
+        if row is None:
+            return None
+        return Job(row[0], row[1], row[2], json.loads(row[3]), *row[4:])
+
+    def load_input(self, job_id: str) -> Optional[Tuple[str, str, Dict, Optional[bytes]]]:
+        """任务的输入 (用户, 文章, 参数, logo 字节)"""
+        row = self._connect().execute(
+            "SELECT user_id, article, params, logo FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2]), row[3]
+
+    def update(self, job_id: str, **fields):
+        """更新任务状态字段"""
+        columns = ', '.join(f"{column} = ?" for column in fields)
+        self._connect().execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def claim(self, job_id: str, owner: str, now: float, lease: float) -> bool:
+        """原子地领取排队中或租约已过期的任务，其他进程正在执行的任务领取失败"""
+        row = self._connect().execute("""
+            UPDATE jobs SET status = :running, owner = :owner, lease_until = :lease_until,
+                            started_at = :now, queue_position = NULL, queue_eta = NULL
+            WHERE id = :id AND (status = :queued
+                                OR (status = :running AND (lease_until IS NULL OR lease_until < :now)))
+            RETURNING id
+        """, {'id': job_id, 'owner': owner, 'now': now, 'lease_until': now + lease,
+              'queued': QUEUED, 'running': RUNNING}).fetchone()
+        return row is not None
+
+    def renew(self, owner: str, now: float, lease: float):
+        """延长 owner 正在执行的所有任务的租约"""
+        self._connect().execute(
+            "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = ?", (now + lease, owner, RUNNING)
+        )
+
+    def finish(self, job_id: str, owner: str, status: str, error: Optional[str] = None):
+        """结束任务；租约已被其他进程接手时不覆盖对方的状态"""
+        self._connect().execute("""
+            UPDATE jobs SET status = ?, error = ?, finished_at = ?, queue_position = NULL, queue_eta = NULL
+            WHERE id = ? AND owner = ?
+        """, (status, error, time.time(), job_id, owner))
+
+    def recoverable(self, now: float) -> List[str]:
+        """排队中和租约已过期的任务，按提交顺序排列"""
+        rows = self._connect().execute("""
+            SELECT id FROM jobs
+            WHERE status = ? OR (status = ? AND (lease_until IS NULL OR lease_until < ?))
+            ORDER BY created_at
+        """, (QUEUED, RUNNING, now)).fetchall()
+        return [row[0] for row in rows]
+
+    def save_cover(self, job_id: str, cover: JobCover, data: Optional[bytes] = None):
+        self._connect().execute("""
+            INSERT OR REPLACE INTO job_covers (job_id, idx, prompt, name, caption, mime, data, error)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (job_id, cover.index, cover.prompt, cover.name, cover.caption, cover.mime, data, cover.error))
+
+    def covers(self, job_id: str) -> List[JobCover]:
+        """任务已完成的封面，按序号排列（不含内容）"""
+        rows = self._connect().execute(
+            "SELECT idx, prompt, name, caption, mime, error FROM job_covers WHERE job_id = ? ORDER BY idx",
+            (job_id,)
+        ).fetchall()
+        return [JobCover(*row) for row in rows]
+
+    def cover_data(self, job_id: str, name: str) -> Optional[bytes]:
+        row = self._connect().execute(
+            "SELECT data FROM job_covers WHERE job_id = ? AND name = ?", (job_id, name)
+        ).fetchone()
+        return row[0] if row else None
+
+    def purge(self, before: float):
+        """删除在 before 之前结束的任务及其封面"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                DELETE FROM job_covers WHERE job_id IN
+                    (SELECT id FROM jobs WHERE status IN (?, ?) AND finished_at < ?)
+            """, (DONE, FAILED, before))
+            conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (DONE, FAILED, before))
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class JobQueue:
+    def __init__(self, store: Optional[JobStore] = None, workers: int = JOB_WORKERS,
+                 retention: float = JOB_RETENTION, lease: float = JOB_LEASE):
+        """
+        后台封面生成任务队列
+        页面只负责提交任务和显示进度，生成在工作线程中进行，页面重新运行、刷新或关闭都不会中断；
+        同时执行的任务数由 workers 决定，与打开的页面数无关。
+        执行中的任务定期续租；创建时和之后每次续租时接手排队中和租约已过期的任务
+        （执行它们的进程已经退出，提示词和图片有缓存，重新执行代价很小）。
+        :param store: 任务存储，默认使用 JOB_DB_PATH
+        :param workers: 工作线程数
+        :param retention: 结束的任务保留多少秒
+        :param lease: 租约秒数，每过三分之一续租一次
+        """
+        self.store = store or JobStore()
+        self.workers = workers
+        self.retention = retention
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.last_purge = 0.0
+        self.pending: 'queue.Queue[str]' = queue.Queue()
+        self.queued_ids = set()  # 已在本进程队列中等待的任务，避免重复加入
+        self.running = 0
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+        self._recover()
+        self.threads = [
+            threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+            for index in range(workers)
+        ]
+        self.threads.append(threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, user_id: str, article: str, params: Dict, logo: Optional[bytes] = None) -> str:
+        """
+        提交生成任务，立即返回任务 ID
+        :param article: 原始文章内容
+        :param params: 生成参数：regenerate、priority、format、max_bytes，有 logo 时还有
+                       x_pos、y_pos、size_percent、opacity；复用相似文章时还有 prompts、similar_to
+        :param logo: 上传的 logo 文件内容
+        """
+        now = time.time()
+        self._purge(now)
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, user_id, article, params, logo, now)
+        self._enqueue(job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    def covers(self, job_id: str) -> List[JobCover]:
+        return self.store.covers(job_id)
+
+    def cover_data(self, job_id: str, name: str) -> Optional[bytes]:
+        """封面内容，优先从内存中的结果存储读取"""
+        data = result_store.get(job_id, name)
+        if data is None:
+            data = self.store.cover_data(job_id, name)
+            if data is not None:
+                result_store.put(job_id, name, data)
+        return data
+
+    def stats(self) -> Dict:
+        with self.lock:
+            running = self.running
+        return {
+            'workers': self.workers,
+            'running': running,
+            'queued': self.pending.qsize(),
+            'coalesced': generation_flights.stats()['followers'],
+        }
+
+    def close(self, timeout: Optional[float] = None):
+        """
+        停止工作线程和续租，等待正在执行的任务结束
+        还没开始的任务留在数据库中，下次创建队列时（或其他进程续租时）接手
+        :param timeout: 最多等待的秒数，None 表示一直等待
+        """
+        self.stopping.set()
+        for _ in range(self.workers):
+            self.pending.put(None)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        self.store.close()
+
+    def _enqueue(self, job_id: str):
+        with self.lock:
+            if job_id in self.queued_ids:
+                return
+            self.queued_ids.add(job_id)
+        self.pending.put(job_id)
+
+    def _recover(self):
+        """把排队中和租约过期的任务加入本进程队列，真正执行前还要领取成功"""
+        try:
+            for job_id in self.store.recoverable(time.time()):
+                self._enqueue(job_id)
+        except sqlite3.Error as e:
+            print(f"恢复任务失败: {str(e)}")
+
+    def _heartbeat(self):
+        """定期续租，并接手其他进程退出后留下的任务"""
+        while not self.stopping.wait(self.lease / 3):
+            try:
+                self.store.renew(self.owner, time.time(), self.lease)
+            except sqlite3.Error as e:
+                print(f"任务续租失败: {str(e)}")
+            self._recover()
+        self.store.close()
+
+    def _worker(self):
+        try:
+            while True:
+                job_id = self.pending.get()
+                if job_id is None or self.stopping.is_set():
+                    break
+                with self.lock:
+                    self.queued_ids.discard(job_id)
+                # 其他进程已经领取或已经结束的任务直接跳过
+                try:
+                    if not self.store.claim(job_id, self.owner, time.time(), self.lease):
+                        continue
+                except sqlite3.Error as e:
+                    print(f"领取任务 {job_id} 失败: {str(e)}")
+                    continue
+                with self.lock:
+                    self.running += 1
+                try:
+                    self._run(job_id)
+                except Exception as e:
+                    print(f"执行任务 {job_id} 时出错: {str(e)}")
+                finally:
+                    with self.lock:
+                        self.running -= 1
+        finally:
+            self.store.close()
+
+    def _run(self, job_id: str):
+        job_input = self.store.load_input(job_id)
+        if job_input is None:
+            return
+        user_id, article, params, logo = job_input
+
+        def on_status(status):
+            self.store.update(job_id, queue_position=status and status.position, queue_eta=status and status.eta)
+
+        try:
+            if logo:
+                pipeline = CoverPipeline(logo=io.BytesIO(logo), x_pos=params['x_pos'], y_pos=params['y_pos'],
+                                         size_percent=params['size_percent'], opacity=params['opacity'], trim=True)
+            else:
+                pipeline = CoverPipeline()
+
+            article = clean_text(article)
+            regenerate = params.get('regenerate', False)
+            # 复用相似文章的提示词时不调用模型，相同的提示词生成图片会命中图片缓存
+            reused = params.get('prompts')
+
+            priority = params.get('priority', False)
+
+            def generate(flight):
+                prompts = iter(reused) if reused else stream_prompts(article, regenerate=regenerate)
+                return iter_images(prompts, user_id=user_id, priority=priority, on_status=flight.notify)
+
+            # 相同的文章和生成参数正在生成时直接共用同一份提示词和原图，logo 仍按各自的设置合成；
+            # 优先级也在 key 中，优先任务不会跟在普通任务的排队之后
+            key = SingleFlight.make_key(article, regenerate, reused, priority)
+            received = {}
+            for result in generation_flights.stream(key, generate, listener=on_status):
+                idx = result.index + 1
+                received[result.index] = result.prompt
+                if not result.ok:
+                    self.store.save_cover(job_id, JobCover(result.index, result.prompt, error=result.error))
+                    continue
+                try:
+                    cover = encode_cover(pipeline.process(result.data), params.get('format', 'PNG'),
+                                         params.get('max_bytes'))
+                except Exception as e:
+                    self.store.save_cover(job_id, JobCover(result.index, result.prompt, error=str(e)))
+                    continue
+                name = f"cover_{idx}.{cover.extension}"
+                caption = f"封面 {idx}（{len(cover.data) / 1024:.0f}KB{'，超出大小上限' if not cover.fits else ''}）"
+                self.store.save_cover(job_id, JobCover(result.index, result.prompt, name, caption, cover.mime),
+                                      cover.data)
+                result_store.put(job_id, name, cover.data)
+
+            # 提示词由模型完整生成时记入相似文章索引，之后转载或小改的文章可以复用
+            if reused:
+                get_similarity_index().touch(params.get('similar_to'))
+            elif len(received) == PROMPT_COUNT and not set(received.values()) & set(DEFAULT_PROMPTS):
+                get_similarity_index().add(article, [received[i] for i in sorted(received)])
+        except Exception as e:
+            self.store.finish(job_id, self.owner, FAILED, str(e))
+            return
+        self.store.finish(job_id, self.owner, DONE)
+
+    def _purge(self, now: float):
+        """定期删除过期的任务"""
+        if now - self.last_purge < 300:
+            return
+        self.last_purge = now
+        try:
+            self.store.purge(now - self.retention)
+        except sqlite3.Error as e:
+            print(f"清理过期任务失败: {str(e)}")
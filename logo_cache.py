@@ -0,0 +1,114 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from PIL import Image
+
+from config import LOGO_CACHE_ITEMS
+
+
+class LogoCache:
+    def __init__(self, max_items: int = LOGO_CACHE_ITEMS):
+        """
+        处理好的 Logo 缓存
+        同一个 Logo 只解码、裁边一次；每种 (尺寸, 不透明度) 只缩放和调整透明度一次，
+        之后预览和每张封面都直接粘贴缓存的 RGBA 图片。
+        返回的图片由多个调用方共享，只能读取不能修改。
+        :param max_items: 解码后的原图和处理后的 Logo 各自最多缓存的数量
+        """
+        self.max_items = max_items
+        self.lock = threading.Lock()
+        self.sources: 'OrderedDict[Tuple, Image.Image]' = OrderedDict()
+        self.prepared: 'OrderedDict[Tuple, Image.Image]' = OrderedDict()
+        self.counters = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def digest(source) -> str:
+        """
+        Logo 的内容标识
+        :param source: 文件路径、字节、上传的文件对象或 PIL 图片
+        """
+        if isinstance(source, str):
+            # 文件路径按修改时间和大小区分，不必每次读取内容
+            stat = os.stat(source)
+            return f"{os.path.abspath(source)}:{stat.st_mtime_ns}:{stat.st_size}"
+        if isinstance(source, Image.Image):
+            data = f"{source.mode}{source.size}".encode() + source.tobytes()
+        elif isinstance(source, bytes):
+            data = source
+        elif hasattr(source, 'getvalue'):
+            data = source.getvalue()
+        else:
+            data = source.read()
+            source.seek(0)
+        return hashlib.sha1(data).hexdigest()
+
+    def load(self, source, trim: bool = False) -> Tuple[str, Image.Image]:
+        """
+        解码 Logo 并转换为 RGBA
+        :param trim: 是否裁掉四周的透明边缘
+        :return: (内容标识, RGBA 图片)
+        """
+        digest = self.digest(source)
+        key = (digest, trim)
+        with self.lock:
+            logo = self.sources.get(key)
+            if logo is not None:
+                self.sources.move_to_end(key)
+                return digest, logo
+
+        if isinstance(source, Image.Image):
+            logo = source
+        else:
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            logo = Image.open(source)
+        logo = logo.convert('RGBA')
+        if trim:
+            bbox = logo.getchannel('A').getbbox()
+            if bbox:
+                logo = logo.crop(bbox)
+
+        with self.lock:
+            self._store(self.sources, key, logo)
+        return digest, logo
+
+    def prepare(self, source, width: int, opacity: int = 100, trim: bool = False) -> Image.Image:
+        """
+        按目标宽度缩放（保持比例）并调整透明度后的 RGBA Logo
+        :param width: 目标宽度（像素）
+        :param opacity: 不透明度（0-100），按比例缩小原有的 alpha 通道
+        :param trim: 是否裁掉四周的透明边缘
+        """
+        digest, base = self.load(source, trim)
+        height = int(width / (base.width / base.height))
+        key = (digest, trim, width, height, opacity)
+        with self.lock:
+            logo = self.prepared.get(key)
+            if logo is not None:
+                self.prepared.move_to_end(key)
+                self.counters['hits'] += 1
+                return logo
+            self.counters['misses'] += 1
+
+        logo = base.resize((width, height), Image.Resampling.LANCZOS)
+        if opacity < 100:
+            table = [int(value * opacity / 100) for value in range(256)]
+            logo.putalpha(logo.getchannel('A').point(table))
+
+        with self.lock:
+            self._store(self.prepared, key, logo)
+        return logo
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {'sources': len(self.sources), 'prepared': len(self.prepared), **self.counters}
+
+    def _store(self, entries: OrderedDict, key, logo: Image.Image):
+        """写入并淘汰最久未使用的条目（调用时需持有锁）"""
+        entries[key] = logo
+        entries.move_to_end(key)
+        while len(entries) > self.max_items:
+            entries.popitem(last=False)
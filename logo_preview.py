@@ -0,0 +1,100 @@
+from typing import Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+from logo_cache import LogoCache
+from utils import logo_cache, paste_logo
+
+# 预览画布背景色和网格线
+PREVIEW_BACKGROUND = (240, 240, 240)
+GRID_COLOR = (200, 200, 200)
+GRID_SPACING = 100
+
+
+class LogoPreview:
+    def __init__(self, size: Tuple[int, int] = (900, 383)):
+        """
+        增量更新的 Logo 位置预览，每个会话一个
+        只重新计算滑块变化影响到的部分：
+        换 logo 才重新解码裁边；改大小才重新缩放；改透明度只用查找表重算 alpha；
+        只改位置时直接在背景上重新粘贴。网格线是缓存好的遮罩，一次粘贴完成。
+        :param size: 预览画布尺寸，与封面尺寸相同
+        """
+        self.size = size
+        self.background = Image.new('RGB', size, PREVIEW_BACKGROUND)
+        self.grid_mask = self._build_grid_mask(size)
+
+        self.logo_id = None
+        self.base: Optional[Image.Image] = None  # 解码、裁边并预先缩小后的 logo
+        self.width = None
+        self.resized: Optional[Image.Image] = None  # 缩放到当前大小的 logo
+        self.resized_alpha: Optional[Image.Image] = None
+        self.opacity = None
+        self.logo: Optional[Image.Image] = None  # 调整过透明度、可以直接粘贴的 logo
+        self.frame_key = None
+        self.frame: Optional[Image.Image] = None
+        self.grid_frame: Optional[Image.Image] = None
+
+    def set_logo(self, upload):
+        """切换到新上传的 logo；同一个上传文件重复调用不做任何事"""
+        logo_id = getattr(upload, 'file_id', None) or LogoCache.digest(upload)
+        if logo_id == self.logo_id:
+            return
+
+        _, base = logo_cache.load(upload, trim=True)
+        # logo 最宽只到画布宽度，特别大的图片先按整数倍快速缩小，之后每次缩放都更快
+        factor = base.width // (2 * self.size[0])
+        if factor >= 2:
+            base = base.reduce(factor)
+
+        self.logo_id = logo_id
+        self.base = base
+        self.width = self.resized = self.resized_alpha = None
+        self.opacity = self.logo = None
+        self.frame_key = self.frame = self.grid_frame = None
+
+    def render(self, size_percent: int, x_pos: int, y_pos: int, opacity: int) -> Image.Image:
+        """按当前设置生成预览图，参数与 utils.combine_images 相同"""
+        width = int(self.size[0] * size_percent / 100)
+        key = (width, opacity, x_pos, y_pos)
+        if key == self.frame_key:
+            return self.frame
+
+        if width != self.width:
+            height = int(width / (self.base.width / self.base.height))
+            self.resized = self.base.resize((width, height), Image.Resampling.LANCZOS)
+            self.resized_alpha = self.resized.getchannel('A')
+            self.width = width
+            self.logo = None
+
+        if self.logo is None or opacity != self.opacity:
+            if opacity < 100:
+                self.logo = self.resized.copy()
+                self.logo.putalpha(self.resized_alpha.point([int(v * opacity / 100) for v in range(256)]))
+            else:
+                self.logo = self.resized
+            self.opacity = opacity
+
+        self.frame = paste_logo(self.background.copy(), self.logo, x_pos, y_pos)
+        self.frame_key = key
+        self.grid_frame = None
+        return self.frame
+
+    def render_grid(self) -> Image.Image:
+        """在最近一次的预览图上叠加网格线"""
+        if self.grid_frame is None:
+            self.grid_frame = self.frame.copy()
+            self.grid_frame.paste(GRID_COLOR, (0, 0) + self.size, self.grid_mask)
+        return self.grid_frame
+
+    @staticmethod
+    def _build_grid_mask(size: Tuple[int, int]) -> Image.Image:
+        """网格线遮罩，每 GRID_SPACING 像素一条线"""
+        mask = Image.new('L', size, 0)
+        draw = ImageDraw.Draw(mask)
+        width, height = size
+        for x in range(0, width, GRID_SPACING):
+            draw.line([(x, 0), (x, height)], fill=255, width=1)
+        for y in range(0, height, GRID_SPACING):
+            draw.line([(0, y), (width, y)], fill=255, width=1)
+        return mask
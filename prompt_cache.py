@@ -0,0 +1,156 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from article_fetcher import clean_text
+from config import PROMPT_CACHE_DIR, PROMPT_CACHE_MEMORY_ITEMS, PROMPT_CACHE_DISK_BYTES
+
+
+class PromptCache:
+    def __init__(self, cache_dir: str = PROMPT_CACHE_DIR,
+                 max_memory_items: int = PROMPT_CACHE_MEMORY_ITEMS,
+                 max_disk_bytes: int = PROMPT_CACHE_DISK_BYTES):
+        """
+        两级提示词缓存：内存LRU + 有容量上限的磁盘缓存（重启后仍然有效）
+        :param cache_dir: 磁盘缓存目录
+        :param max_memory_items: 内存中最多保留的条目数
+        :param max_disk_bytes: 磁盘缓存的总字节数上限
+        """
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    @staticmethod
+    def make_key(article_text: str, system_prompt: str, temperature: float) -> str:
+        """根据规范化后的文章、系统提示词和温度计算缓存键"""
+        if isinstance(article_text, bytes):
+            article_text = article_text.decode('utf-8')
+        payload = '\0'.join([clean_text(article_text), system_prompt, repr(float(temperature))])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """读取缓存，先查内存再查磁盘"""
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return list(self.memory[key])
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                prompts = json.load(f)
+            # 更新修改时间，磁盘淘汰按最近使用排序
+            os.utime(path)
+        except (OSError, ValueError):
+            with self.lock:
+                self.counters['misses'] += 1
+            return None
+
+        with self.lock:
+            self.counters['disk_hits'] += 1
+            self._remember(key, prompts)
+        return list(prompts)
+
+    def put(self, key: str, prompts: List[str]):
+        """写入缓存，磁盘写入先写临时文件再原子替换"""
+        with self.lock:
+            self._remember(key, prompts)
+
+        data = json.dumps(prompts, ensure_ascii=False).encode('utf-8')
+        path = self._path(key)
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # 替换文件和容量统计放在同一把锁里，并发写入同一个键时不会重复计算旧文件大小
+            with self.lock:
+                old_size = os.path.getsize(path) if os.path.exists(path) else 0
+                os.replace(tmp_path, path)
+                tmp_path = None
+                self.disk_bytes += len(data) - old_size
+                if self.disk_bytes > self.max_disk_bytes:
+                    self._evict_disk()
+        except OSError as e:
+            print(f"写入提示词缓存失败: {str(e)}")
+        finally:
+            # 写入或替换失败时删除留下的临时文件
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict:
+        """返回命中/未命中计数和当前容量"""
+        with self.lock:
+            lookups = sum(self.counters.values())
+            hits = self.counters['memory_hits'] + self.counters['disk_hits']
+            return {
+                **self.counters,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'memory_items': len(self.memory),
+                'disk_bytes': self.disk_bytes
+            }
+
+    def _remember(self, key, prompts):
+        """放入内存LRU，超出上限时淘汰最久未使用的条目"""
+        self.memory[key] = list(prompts)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_items:
+            self.memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def _disk_entries(self):
+        """列出磁盘缓存文件: (路径, 大小, 最后使用时间)"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict_disk(self):
+        """按最近使用时间淘汰磁盘缓存，直到总大小回到上限以内"""
+        entries = sorted(self._disk_entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self.disk_bytes = total
+
+
+_lock = threading.Lock()
+_prompt_cache: Optional[PromptCache] = None
+
+
+def get_prompt_cache() -> PromptCache:
+    """进程内共享的提示词缓存，首次生成提示词时创建"""
+    global _prompt_cache
+    if _prompt_cache is None:
+        with _lock:
+            if _prompt_cache is None:
+                _prompt_cache = PromptCache()
+    return _prompt_cache
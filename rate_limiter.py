@@ -1,49 +1,223 @@
 import os
 import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
 from datetime import datetime, timedelta
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Optional
+
+import db_utils
+
+
+class RateLimitStore(ABC):
+    """
+    使用次数存储接口
+    每个用户保存 (当前窗口内的次数, 窗口开始时间)，时间均为 Unix 时间戳
+    """
+
+    @abstractmethod
+    def get(self, user_id: str, now: float, window: float) -> Optional[Tuple[int, float]]:
+        """返回用户当前窗口的 (次数, 窗口开始时间)，没有记录或已过期时返回 None"""
+
+    @abstractmethod
+    def check_and_increment(self, user_id: str, limit: int, now: float, window: float) -> Tuple[bool, int, float]:
+        """
+        原子地检查并增加次数
+        :return: (是否允许, 增加后的次数, 窗口开始时间)
+        """
+
+
+class SQLiteStore(RateLimitStore):
+    def __init__(self, path: str, purge_interval: float = 300):
+        """
+        基于 SQLite (WAL 模式) 的存储，多个会话和进程可以同时读写
+        :param path: 数据库文件路径
+        :param purge_interval: 清理过期记录的最小间隔秒数
+        """
+        self.path = path
+        self.purge_interval = purge_interval
+        self.last_purge = 0.0
+        self.local = threading.local()
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS usage (
+                user_id TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                window_start REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_expires_at ON usage (expires_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """每个线程使用自己的连接"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = db_utils.connect(self.path)
+            self.local.conn = conn
+        return conn
+
+    def get(self, user_id, now, window):
+        row = self._connect().execute(
+            "SELECT count, window_start FROM usage WHERE user_id = ? AND expires_at > ?",
+            (user_id, now)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def check_and_increment(self, user_id, limit, now, window):
+        self._purge(now)
+        if limit <= 0:
+            current = self.get(user_id, now, window)
+            return (False,) + (current or (0, now))
+
+        conn = self._connect()
+        # 一条语句完成检查和加一：窗口过期则重新计数，未达到上限才更新
+        row = conn.execute("""
+            INSERT INTO usage (user_id, count, window_start, expires_at)
+            VALUES (:user_id, 1, :now, :expires_at)
+            ON CONFLICT (user_id) DO UPDATE SET
+                count = CASE WHEN usage.expires_at <= :now THEN 1 ELSE usage.count + 1 END,
+                window_start = CASE WHEN usage.expires_at <= :now THEN :now ELSE usage.window_start END,
+                expires_at = CASE WHEN usage.expires_at <= :now THEN :expires_at ELSE usage.expires_at END
+            WHERE usage.expires_at <= :now OR usage.count < :limit
+            RETURNING count, window_start
+        """, {'user_id': user_id, 'now': now, 'expires_at': now + window, 'limit': limit}).fetchone()
+
+        if row is not None:
+            return True, row[0], row[1]
+
+        current = self.get(user_id, now, window)
+        return (False,) + (current or (limit, now))
+
+    def import_json(self, path: str, window: float) -> int:
+        """
+        一次性导入旧版 JSON 文件中仍在有效窗口内的计数，已有记录的用户不覆盖
+        导入后把文件改名为 .migrated，之后不会重复导入
+        :param path: 旧版 JSONFileStore 的文件路径
+        :param window: 时间窗口秒数
+        :return: 导入的用户数
+        """
+        if not os.path.exists(path):
+            return 0
+        legacy = JSONFileStore(path)
+        now = time.time()
+        rows = []
+        for user_id in legacy.usage_data:
+            try:
+                current = legacy.get(user_id, now, window)
+            except (KeyError, TypeError, ValueError):
+                continue
+            if current is not None:
+                count, window_start = current
+                rows.append((user_id, count, window_start, window_start + window))
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO usage (user_id, count, window_start, expires_at) VALUES (?, ?, ?, ?)", rows
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+        try:
+            os.replace(path, path + '.migrated')
+        except OSError as e:
+            print(f"重命名旧的使用数据文件失败: {str(e)}")
+        return len(rows)
+
+    def _purge(self, now):
+        """按索引删除过期记录，不扫描全表"""
+        if now - self.last_purge < self.purge_interval:
+            return
+        self.last_purge = now
+        self._connect().execute("DELETE FROM usage WHERE expires_at <= ?", (now,))
+
+
+class JSONFileStore(RateLimitStore):
+    def __init__(self, path: str):
+        """
+        原来的 JSON 文件存储，每次修改都重写整个文件，只适合单进程少量用户
+        :param path: JSON 文件路径
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.usage_data = json.load(f)
+        else:
+            self.usage_data = {}
+
+    def save_data(self):
+        """保存使用数据"""
+        with open(self.path, 'w') as f:
+            json.dump(self.usage_data, f)
+
+    def get(self, user_id, now, window):
+        data = self.usage_data.get(user_id)
+        if data is None:
+            return None
+        window_start = datetime.fromisoformat(data['last_reset']).timestamp()
+        if now - window_start >= window:
+            return None
+        return data['count'], window_start
+
+    def check_and_increment(self, user_id, limit, now, window):
+        with self.lock:
+            current = self.get(user_id, now, window)
+            count, window_start = current or (0, now)
+            if count >= limit:
+                return False, count, window_start
+
+            self.usage_data[user_id] = {
+                'count': count + 1,
+                'last_reset': datetime.fromtimestamp(window_start).isoformat()
+            }
+            self.save_data()
+            return True, count + 1, window_start
+
 
 class RateLimiter:
-    def __init__(self, limit: int = 3, window: int = 24):
+    def __init__(self, limit: int = 3, window: int = 24, store: Optional[RateLimitStore] = None):
         """
         初始化速率限制器
         :param limit: 每个时间窗口允许的请求次数
         :param window: 时间窗口小时数
+        :param store: 使用次数存储，默认使用项目目录下的 SQLite 数据库
         """
         self.limit = limit
         self.window = window
-        self.storage_path = os.path.join(os.path.dirname(__file__), 'usage_data.json')
+        if store is None:
+            # 默认使用项目目录下的 SQLite 数据库，第一次启动时导入旧版 JSON 文件中的计数
+            directory = os.path.dirname(os.path.abspath(__file__))
+            store = SQLiteStore(os.path.join(directory, 'usage_data.db'))
+            store.import_json(os.path.join(directory, 'usage_data.json'), window * 3600)
+        self.store = store
         # 添加白名单用户
         self.whitelist = {
             # 这里添加你的用户标识
             "admin",  # 管理员用户名
         }
-        self.load_data()
-    
-    def load_data(self):
-        """加载使用数据"""
-        if os.path.exists(self.storage_path):
-            with open(self.storage_path, 'r') as f:
-                self.usage_data = json.load(f)
-        else:
-            self.usage_data = {}
-    
-    def save_data(self):
-        """保存使用数据"""
-        with open(self.storage_path, 'w') as f:
-            json.dump(self.usage_data, f)
-    
-    def clean_old_data(self):
-        """清理过期数据"""
-        now = datetime.now()
-        self.usage_data = {
-            user_id: data for user_id, data in self.usage_data.items()
-            if now - datetime.fromisoformat(data['last_reset']) < timedelta(hours=self.window)
+
+    def _build_info(self, count: int, window_start: float, now: float) -> Dict:
+        """生成剩余次数和重置时间信息"""
+        remaining = max(0, self.limit - count)
+        reset_in = timedelta(seconds=max(0.0, window_start + self.window * 3600 - now))
+
+        hours = int(reset_in.total_seconds() // 3600)
+        minutes = int((reset_in.total_seconds() % 3600) // 60)
+
+        return {
+            'remaining_requests': remaining,
+            'reset_in': f'{hours}小时{minutes}分钟后重置'
         }
-    
+
     def get_usage_info(self, user_id: str) -> Tuple[bool, Dict]:
         """
-        获取使用情况信息
+        获取使用情况信息（只读，不会修改计数）
         :param user_id: 用户标识
         :return: (是否允许请求, 使用信息)
         """
@@ -53,54 +227,24 @@ class RateLimiter:
                 'remaining_requests': '无限制',
                 'reset_in': '永久有效'
             }
-        
-        # 清理过期数据
-        self.clean_old_data()
-        
-        now = datetime.now()
-        
-        # 如果是新用户或者数据已过期
-        if user_id not in self.usage_data:
-            self.usage_data[user_id] = {
-                'count': 0,
-                'last_reset': now.isoformat()
-            }
-            self.save_data()
-        
-        user_data = self.usage_data[user_id]
-        last_reset = datetime.fromisoformat(user_data['last_reset'])
-        
-        # 如果超过时间窗口，重置计数
-        if now - last_reset > timedelta(hours=self.window):
-            user_data['count'] = 0
-            user_data['last_reset'] = now.isoformat()
-            self.save_data()
-        
-        # 计算剩余请求次数和重置时间
-        remaining = self.limit - user_data['count']
-        reset_time = last_reset + timedelta(hours=self.window)
-        reset_in = reset_time - now
-        
-        hours = int(reset_in.total_seconds() // 3600)
-        minutes = int((reset_in.total_seconds() % 3600) // 60)
-        
-        info = {
-            'remaining_requests': remaining,
-            'reset_in': f'{hours}小时{minutes}分钟后重置'
-        }
-        
-        return remaining > 0, info
-    
+
+        now = time.time()
+        count, window_start = self.store.get(user_id, now, self.window * 3600) or (0, now)
+        return count < self.limit, self._build_info(count, window_start, now)
+
     def check_rate_limit(self, user_id: str) -> Tuple[bool, Dict]:
         """
-        检查是否超出速率限制
+        检查是否超出速率限制，允许时原子地增加一次计数
         :param user_id: 用户标识
         :return: (是否允许请求, 使用信息)
         """
-        allowed, info = self.get_usage_info(user_id)
-        
-        if allowed and user_id not in self.whitelist:
-            self.usage_data[user_id]['count'] += 1
-            self.save_data()
-        
-        return allowed, info 
\ No newline at end of file
+        if user_id in self.whitelist:
+            return self.get_usage_info(user_id)
+
+        now = time.time()
+        allowed, count, window_start = self.store.check_and_increment(
+            user_id, self.limit, now, self.window * 3600
+        )
+        # 与原来一致：返回的是本次请求之前的剩余次数
+        previous = count - 1 if allowed else count
+        return allowed, self._build_info(previous, window_start, now)
@@ -0,0 +1,170 @@
+import os
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from config import RESULT_STORE_MEMORY_BYTES, RESULT_STORE_TTL
+
+
+@dataclass
+class StoredResult:
+    """一个任务的一个结果文件"""
+    size: int
+    data: Optional[bytes] = None  # 在内存中时的内容
+    path: Optional[str] = None  # 转存到磁盘后的文件路径
+    spilling: bool = False  # 正在写入磁盘
+
+
+class ResultStore:
+    def __init__(self, memory_budget: int = RESULT_STORE_MEMORY_BYTES,
+                 ttl: float = RESULT_STORE_TTL,
+                 spill_dir: Optional[str] = None):
+        """
+        所有任务共享的生成结果存储，只保存编码好的字节，按 (任务 ID, 文件名) 读取
+        内存中的总字节数超过 memory_budget 时，把最久没有查看的结果转存到临时目录；
+        超过 ttl 没有访问的任务整体删除。
+        :param memory_budget: 所有任务加起来在内存中保存的字节数上限
+        :param ttl: 任务的结果多少秒没有访问后删除
+        :param spill_dir: 转存目录，默认在系统临时目录下创建，进程退出时删除
+        """
+        self.memory_budget = memory_budget
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries: 'OrderedDict[Tuple[str, str], StoredResult]' = OrderedDict()  # 按最近查看排序
+        self.jobs: Dict[str, float] = {}  # 任务 -> 最后访问时间
+        self.names: Dict[str, List[str]] = {}  # 任务 -> 结果名称
+        self.resident_bytes = 0
+        self.spilled_bytes = 0
+        self.counters = {'spills': 0, 'disk_reads': 0, 'expired_jobs': 0}
+        if spill_dir is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix='wechat-covers-')
+            spill_dir = self._tmp.name
+        self.spill_dir = spill_dir
+        os.makedirs(self.spill_dir, exist_ok=True)
+
+    def put(self, job_id: str, name: str, data: bytes):
+        """保存一个结果，同名的会被替换"""
+        with self.lock:
+            self._remove((job_id, name))
+            self.entries[(job_id, name)] = StoredResult(len(data), data=data)
+            self.names.setdefault(job_id, []).append(name)
+            self.resident_bytes += len(data)
+            self.jobs[job_id] = time.monotonic()
+            victims = self._pick_victims()
+        self._spill(victims)
+        self.cleanup()
+
+    def get(self, job_id: str, name: str) -> Optional[bytes]:
+        """读取结果内容，已转存到磁盘的从文件读取"""
+        with self.lock:
+            entry = self.entries.get((job_id, name))
+            if entry is None:
+                return None
+            self.entries.move_to_end((job_id, name))
+            self.jobs[job_id] = time.monotonic()
+            if entry.data is not None:
+                return entry.data
+            path = entry.path
+            self.counters['disk_reads'] += 1
+
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError as e:
+            print(f"读取转存的结果失败: {str(e)}")
+            return None
+
+    def cleanup(self):
+        """删除长时间没有访问的任务的结果"""
+        now = time.monotonic()
+        with self.lock:
+            for job_id, last_seen in list(self.jobs.items()):
+                if now - last_seen > self.ttl:
+                    for name in list(self.names.get(job_id, [])):
+                        self._remove((job_id, name))
+                    self.names.pop(job_id, None)
+                    self.jobs.pop(job_id, None)
+                    self.counters['expired_jobs'] += 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            spilled = sum(1 for entry in self.entries.values() if entry.data is None)
+            return {
+                'jobs': len(self.jobs),
+                'entries': len(self.entries),
+                'resident_bytes': self.resident_bytes,
+                'memory_budget': self.memory_budget,
+                'spilled_entries': spilled,
+                'spilled_bytes': self.spilled_bytes,
+                **self.counters,
+            }
+
+    def _pick_victims(self) -> List[Tuple[Tuple[str, str], StoredResult]]:
+        """选出需要转存的最久没有查看的结果，直到内存占用不超过预算（调用时需持有锁）"""
+        victims = []
+        excess = self.resident_bytes - self.memory_budget
+        for key, entry in self.entries.items():
+            if excess <= 0:
+                break
+            if entry.data is None or entry.spilling:
+                continue
+            entry.spilling = True
+            victims.append((key, entry))
+            excess -= entry.size
+        return victims
+
+    def _spill(self, victims):
+        """在锁外把选中的结果写到磁盘，写完后再切换为从磁盘读取"""
+        for key, entry in victims:
+            path = None
+            try:
+                fd, path = tempfile.mkstemp(dir=self.spill_dir, suffix='.bin')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(entry.data)
+            except OSError as e:
+                print(f"转存结果失败: {str(e)}")
+                if path:
+                    self._unlink(path)
+                with self.lock:
+                    entry.spilling = False
+                continue
+
+            with self.lock:
+                entry.spilling = False
+                # 写入期间结果可能已被替换或删除
+                if self.entries.get(key) is not entry:
+                    stale = path
+                else:
+                    stale = None
+                    entry.path, entry.data = path, None
+                    self.resident_bytes -= entry.size
+                    self.spilled_bytes += entry.size
+                    self.counters['spills'] += 1
+            if stale:
+                self._unlink(stale)
+
+    def _remove(self, key):
+        """删除一个结果及其转存文件（调用时需持有锁）"""
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.names[key[0]].remove(key[1])
+        if entry.data is not None:
+            self.resident_bytes -= entry.size
+        else:
+            self.spilled_bytes -= entry.size
+            self._unlink(entry.path)
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# 进程内所有任务共享的结果存储
+result_store = ResultStore()
@@ -0,0 +1,135 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import db_utils
+from config import SELECTOR_REGISTRY_PATH, SELECTOR_MAX_MISSES, SELECTOR_TTL_DAYS
+
+
+class SelectorRegistry:
+    def __init__(self, storage_path: str = SELECTOR_REGISTRY_PATH,
+                 max_misses: int = SELECTOR_MAX_MISSES,
+                 ttl_days: int = SELECTOR_TTL_DAYS):
+        """
+        按站点记录抓取成功过的正文选择器，下次抓取同一站点时优先尝试
+        保存在 SQLite (WAL 模式) 中，每次命中或失败只更新一行，多个进程同时抓取不会互相覆盖
+        :param storage_path: 数据库文件路径
+        :param max_misses: 连续失败多少次后移除该选择器
+        :param ttl_days: 多少天没有命中后过期
+        """
+        self.storage_path = storage_path
+        self.max_misses = max_misses
+        self.ttl = timedelta(days=ttl_days)
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(storage_path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS selectors (
+                host TEXT NOT NULL,
+                selector TEXT NOT NULL,
+                source TEXT NOT NULL,
+                hits INTEGER NOT NULL,
+                misses INTEGER NOT NULL,
+                last_hit TEXT NOT NULL,
+                PRIMARY KEY (host, selector)
+            )
+        """)
+        self.import_json(os.path.splitext(storage_path)[0] + '.json')
+
+    def _connect(self) -> sqlite3.Connection:
+        """每个线程使用自己的连接"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = db_utils.connect(self.storage_path)
+            self.local.conn = conn
+        return conn
+
+    def import_json(self, path: str) -> int:
+        """
+        一次性导入旧版 JSON 文件中的选择器，已有的记录不覆盖
+        导入后把文件改名为 .migrated，之后不会重复导入
+        :return: 导入的选择器数
+        """
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            rows = [
+                (host, selector, stats.get('source', 'common'), stats['hits'], stats['misses'], stats['last_hit'])
+                for host, selectors in data.items()
+                for selector, stats in selectors.items()
+            ]
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            print(f"读取旧的选择器数据失败: {str(e)}")
+            return 0
+
+        self._connect().executemany("""
+            INSERT OR IGNORE INTO selectors (host, selector, source, hits, misses, last_hit)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        try:
+            os.replace(path, path + '.migrated')
+        except OSError as e:
+            print(f"重命名旧的选择器数据文件失败: {str(e)}")
+        return len(rows)
+
+    def candidates(self, host: str) -> List[str]:
+        """
+        返回该站点可用的选择器，最近失败过的排在后面，其余按命中次数排序
+        过期的选择器会在这里被清理
+        """
+        conn = self._connect()
+        # ISO 格式的时间字符串可以直接按字符串比较
+        expires = (datetime.now() - self.ttl).isoformat()
+        conn.execute("DELETE FROM selectors WHERE host = ? AND last_hit < ?", (host, expires))
+        rows = conn.execute(
+            "SELECT selector FROM selectors WHERE host = ? ORDER BY misses, hits DESC", (host,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def record_hit(self, host: str, selector: str, source: str = 'common'):
+        """
+        记录一次成功抓取
+        :param source: 选择器来源，common 为内置选择器，local 为本地正文识别得到，ai 为 AI 分析得到
+        """
+        self._connect().execute("""
+            INSERT INTO selectors (host, selector, source, hits, misses, last_hit)
+            VALUES (?, ?, ?, 1, 0, ?)
+            ON CONFLICT (host, selector) DO UPDATE SET
+                hits = hits + 1, misses = 0, last_hit = excluded.last_hit
+        """, (host, selector, source, datetime.now().isoformat()))
+
+    def record_miss(self, host: str, selector: str):
+        """记录一次失败，连续失败达到上限后移除该选择器"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE selectors SET misses = misses + 1 WHERE host = ? AND selector = ?", (host, selector)
+            )
+            conn.execute(
+                "DELETE FROM selectors WHERE host = ? AND selector = ? AND misses >= ?",
+                (host, selector, self.max_misses)
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+
+_lock = threading.Lock()
+_selector_registry: Optional[SelectorRegistry] = None
+
+
+def get_selector_registry() -> SelectorRegistry:
+    """进程内共享的选择器记录，首次抓取文章时才打开数据库"""
+    global _selector_registry
+    if _selector_registry is None:
+        with _lock:
+            if _selector_registry is None:
+                _selector_registry = SelectorRegistry()
+    return _selector_registry
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import (SIMILARITY_INDEX_PATH, SIMILARITY_MAX_DISTANCE, SIMILARITY_MIN_CHARS,
+                    SIMILARITY_INDEX_MAX_ENTRIES, SIMILARITY_INDEX_TTL_DAYS)
+import db_utils
+
+# 指纹位数和分词时每个片段的字数
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 3
+
+
+def simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> int:
+    """
+    文章的 64 位 SimHash 指纹
+    按连续 shingle_size 个字切片（中英文都适用），重复出现的片段权重更高；
+    内容相近的文章指纹只有少数几位不同。
+    """
+    text = ''.join(text.split())
+    shingles = Counter(text[i:i + shingle_size] for i in range(max(1, len(text) - shingle_size + 1)))
+    digests = b''.join(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest() for shingle in shingles)
+    # 每个片段的 64 位哈希展开成 0/1 矩阵，按出现次数加权投票，一次矩阵乘法完成
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1).astype(np.int32)
+    counts = np.fromiter(shingles.values(), dtype=np.int32, count=len(shingles))
+    weights = counts @ (2 * bits - 1)
+    return int.from_bytes(np.packbits(weights > 0).tobytes(), 'big')
+
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    """uint64 数组每个元素中 1 的个数"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+@dataclass
+class SimilarArticle:
+    """索引中找到的相似文章"""
+    digest: str
+    title: str
+    prompts: List[str]
+    distance: int
+
+    @property
+    def similarity(self) -> float:
+        return 1 - self.distance / FINGERPRINT_BITS
+
+
+class SimilarityIndex:
+    def __init__(self, path: str = SIMILARITY_INDEX_PATH,
+                 max_distance: int = SIMILARITY_MAX_DISTANCE,
+                 max_entries: int = SIMILARITY_INDEX_MAX_ENTRIES,
+                 ttl_days: int = SIMILARITY_INDEX_TTL_DAYS):
+        """
+        相似文章索引：转载、改标题、加尾注等轻微修改后的文章直接复用之前的提示词
+        （提示词相同，图片生成会命中图片缓存）。
+        所有指纹放在一个 uint64 数组中，查找时一次向量化的异或和计数比较全部条目，
+        一万条约几十微秒，与阈值大小无关。
+        条目保存在 SQLite 中，启动时载入内存；启动和每次加入新文章时淘汰超过 ttl_days 未使用的，
+        超出 max_entries 时淘汰最久未使用的。
+        :param path: 数据库文件路径
+        :param max_distance: 视为相似的最大指纹差异位数
+        :param max_entries: 最多保存的文章数
+        :param ttl_days: 多少天未使用后过期
+        """
+        self.path = path
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.ttl = ttl_days * 24 * 3600
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+        self.entries: 'OrderedDict[str, Dict]' = OrderedDict()  # 文章摘要 -> 条目，按最近使用排序
+        # 指纹数组的前 len(entries) 项有效，slots 记录每篇文章在数组中的位置
+        self.fingerprints = np.zeros(max_entries + 1, dtype=np.uint64)
+        self.digests: List[str] = []
+        self.slots: Dict[str, int] = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS articles (
+                digest TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                title TEXT NOT NULL,
+                prompts TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_last_used ON articles (last_used)")
+        self._load()
+
+    def _connect(self) -> sqlite3.Connection:
+        """每个线程使用自己的连接"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = db_utils.connect(self.path)
+            self.local.conn = conn
+        return conn
+
+    def _load(self):
+        """删除过期条目后载入最近使用的 max_entries 条"""
+        conn = self._connect()
+        conn.execute("DELETE FROM articles WHERE last_used < ?", (time.time() - self.ttl,))
+        rows = conn.execute(
+            "SELECT digest, fingerprint, title, prompts, last_used FROM articles ORDER BY last_used DESC LIMIT ?",
+            (self.max_entries,)
+        ).fetchall()
+        rows.reverse()
+        with self.lock:
+            for digest, fingerprint, title, prompts, last_used in rows:
+                self._insert(digest, int(fingerprint, 16), title, json.loads(prompts), last_used)
+
+    @staticmethod
+    def digest(article: str) -> str:
+        return hashlib.sha1(article.encode('utf-8')).hexdigest()
+
+    def lookup(self, article: str) -> Optional[SimilarArticle]:
+        """
+        查找最相似的文章，没有差异在 max_distance 位以内的返回 None
+        :param article: clean_text 处理后的文章
+        """
+        if len(article) < SIMILARITY_MIN_CHARS:
+            return None
+        return self.lookup_fingerprint(simhash(article))
+
+    def lookup_fingerprint(self, fingerprint: int) -> Optional[SimilarArticle]:
+        """按指纹查找差异位数最少的文章"""
+        with self.lock:
+            if self.digests:
+                distances = popcount(self.fingerprints[:len(self.digests)] ^ np.uint64(fingerprint))
+                slot = int(distances.argmin())
+                distance = int(distances[slot])
+                if distance <= self.max_distance:
+                    self.counters['hits'] += 1
+                    digest = self.digests[slot]
+                    entry = self.entries[digest]
+                    return SimilarArticle(digest, entry['title'], list(entry['prompts']), distance)
+            self.counters['misses'] += 1
+            return None
+
+    def add(self, article: str, prompts: List[str]):
+        """
+        记录文章生成时使用的提示词，同一篇文章会被更新
+        :param article: clean_text 处理后的文章
+        """
+        if len(article) < SIMILARITY_MIN_CHARS:
+            return
+        digest = self.digest(article)
+        fingerprint = simhash(article)
+        title = article.strip().split('\n', 1)[0][:30]
+        now = time.time()
+
+        with self.lock:
+            self._remove(digest)
+            self._insert(digest, fingerprint, title, list(prompts), now)
+            # 条目按最近使用排序，从最旧的开始淘汰超出数量上限或过期的
+            evicted = []
+            while self.entries:
+                oldest = next(iter(self.entries))
+                if len(self.entries) <= self.max_entries and self.entries[oldest]['last_used'] >= now - self.ttl:
+                    break
+                self._remove(oldest)
+                evicted.append(oldest)
+                self.counters['evictions'] += 1
+
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO articles (digest, fingerprint, title, prompts, last_used) VALUES (?, ?, ?, ?, ?)",
+            (digest, f"{fingerprint:016x}", title, json.dumps(prompts, ensure_ascii=False), now)
+        )
+        if evicted:
+            conn.executemany("DELETE FROM articles WHERE digest = ?", [(d,) for d in evicted])
+
+    def touch(self, digest: str):
+        """记录一次复用，推迟淘汰"""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                return
+            entry['last_used'] = now
+            self.entries.move_to_end(digest)
+        self._connect().execute("UPDATE articles SET last_used = ? WHERE digest = ?", (now, digest))
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {'entries': len(self.entries), **self.counters}
+
+    def _insert(self, digest, fingerprint, title, prompts, last_used):
+        """加入内存索引（调用时需持有锁）"""
+        self.entries[digest] = {'title': title, 'prompts': prompts, 'last_used': last_used}
+        self.slots[digest] = len(self.digests)
+        self.fingerprints[len(self.digests)] = fingerprint
+        self.digests.append(digest)
+
+    def _remove(self, digest):
+        """从内存索引中删除，数组最后一项移到空出的位置（调用时需持有锁）"""
+        if self.entries.pop(digest, None) is None:
+            return
+        slot = self.slots.pop(digest)
+        last = self.digests.pop()
+        if last != digest:
+            self.digests[slot] = last
+            self.slots[last] = slot
+            self.fingerprints[slot] = self.fingerprints[len(self.digests)]
+
+
+_lock = threading.Lock()
+_similarity_index: Optional[SimilarityIndex] = None
+
+
+def get_similarity_index() -> SimilarityIndex:
+    """进程内共享的相似文章索引，首次查询或写入时从数据库加载"""
+    global _similarity_index
+    if _similarity_index is None:
+        with _lock:
+            if _similarity_index is None:
+                _similarity_index = SimilarityIndex()
+    return _similarity_index
@@ -0,0 +1,124 @@
+import json
+import hashlib
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+
+class Flight:
+    def __init__(self):
+        """
+        一次正在进行的计算，结果按产出顺序广播给所有订阅者
+        后加入的订阅者先拿到已经产出的结果，再继续等待后面的结果。
+        """
+        self.cond = threading.Condition()
+        self.items: List = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.listeners: List[Callable] = []
+
+    def publish(self, item):
+        with self.cond:
+            self.items.append(item)
+            self.cond.notify_all()
+
+    def finish(self, error: Optional[Exception] = None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def notify(self, *args):
+        """把计算过程中的状态（如排队位置）转发给所有订阅者的回调"""
+        with self.cond:
+            listeners = list(self.listeners)
+        for listener in listeners:
+            try:
+                listener(*args)
+            except Exception as e:
+                print(f"状态回调出错: {str(e)}")
+
+    def add_listener(self, listener: Optional[Callable]):
+        if listener is not None:
+            with self.cond:
+                self.listeners.append(listener)
+
+    def subscribe(self, listener: Optional[Callable] = None) -> Iterator:
+        """逐个读取结果，计算失败时抛出同一个异常"""
+        index = 0
+        try:
+            while True:
+                with self.cond:
+                    while index >= len(self.items) and not self.done:
+                        self.cond.wait()
+                    if index < len(self.items):
+                        item = self.items[index]
+                        index += 1
+                    elif self.error is not None:
+                        raise self.error
+                    else:
+                        return
+                yield item
+        finally:
+            if listener is not None:
+                with self.cond:
+                    if listener in self.listeners:
+                        self.listeners.remove(listener)
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        合并相同的进行中请求
+        同一个 key 同时只执行一次，之后到达的请求直接订阅正在进行的结果流；
+        计算结束后 key 被移除，后面的请求重新执行（通常会命中缓存）。
+        """
+        self.lock = threading.Lock()
+        self.flights: Dict[str, Flight] = {}
+        self.counters = {'leaders': 0, 'followers': 0}
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """由请求内容和参数生成 key"""
+        data = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def stream(self, key: str, produce: Callable[[Flight], Iterable],
+               listener: Optional[Callable] = None) -> Iterator:
+        """
+        订阅 key 对应的计算结果
+        第一个请求在后台线程中执行 produce，结果逐个广播；调用方中途离开不影响其他订阅者，
+        计算会继续完成（结果仍会写入各级缓存）。
+        :param produce: 接收 Flight 返回结果序列的函数，可以用 flight.notify 转发状态
+        :param listener: 接收 flight.notify 转发的状态的回调
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight()
+                self.flights[key] = flight
+                self.counters['leaders'] += 1
+            else:
+                self.counters['followers'] += 1
+            flight.add_listener(listener)
+
+        if leader:
+            threading.Thread(target=self._run, args=(key, flight, produce),
+                             name="singleflight", daemon=True).start()
+        return flight.subscribe(listener)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {'in_flight': len(self.flights), **self.counters}
+
+    def _run(self, key: str, flight: Flight, produce: Callable[[Flight], Iterable]):
+        try:
+            for item in produce(flight):
+                flight.publish(item)
+            flight.finish()
+        except Exception as e:
+            flight.finish(e)
+        finally:
+            with self.lock:
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
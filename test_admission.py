@@ -0,0 +1,84 @@
+import threading
+
+from admission import AdmissionController, AdmissionTimeout, AdmissionCancelled
+
+
+def admission_order(controller, tickets):
+    """依次结束已放行的请求，返回 tickets 中各请求被放行的顺序"""
+    order = []
+    pending = dict(tickets)
+    while pending:
+        admitted = [name for name, ticket in pending.items() if ticket.admitted_at is not None]
+        assert len(admitted) == 1, admitted
+        name = admitted[0]
+        order.append(name)
+        controller.release(pending.pop(name))
+    return order
+
+
+def test_users_take_turns():
+    controller = AdmissionController(max_concurrent=1)
+    blocker = controller.enqueue('blocker')
+    # a 一次提交三张图，b 随后提交一张，b 不需要等 a 全部完成
+    tickets = [(f'a{i}', controller.enqueue('a')) for i in range(3)] + [('b0', controller.enqueue('b'))]
+    controller.release(blocker)
+    assert admission_order(controller, tickets) == ['a0', 'b0', 'a1', 'a2']
+
+
+def test_priority_goes_first():
+    controller = AdmissionController(max_concurrent=1)
+    blocker = controller.enqueue('blocker')
+    tickets = [
+        ('normal0', controller.enqueue('normal')),
+        ('normal1', controller.enqueue('other')),
+        ('vip0', controller.enqueue('vip', priority=True)),
+        ('vip1', controller.enqueue('vip', priority=True)),
+    ]
+    controller.release(blocker)
+    assert admission_order(controller, tickets) == ['vip0', 'vip1', 'normal0', 'normal1']
+
+
+def test_concurrency_limit():
+    controller = AdmissionController(max_concurrent=2)
+    tickets = [controller.enqueue(f'user{i}') for i in range(5)]
+    assert sum(ticket.admitted_at is not None for ticket in tickets) == 2
+    status = controller.status(tickets[4])
+    assert status.position == 2
+    controller.release(tickets[0])
+    assert sum(ticket.admitted_at is not None for ticket in tickets) == 3
+
+
+def test_queue_timeout():
+    controller = AdmissionController(max_concurrent=1)
+    blocker = controller.enqueue('blocker')
+    waiting = controller.enqueue('user')
+    try:
+        controller.wait(waiting, timeout=0.05)
+        assert False, "应该超时"
+    except AdmissionTimeout:
+        pass
+    # 超时的请求不再占用队列，名额归还后不会被放行
+    controller.release(blocker)
+    assert waiting.admitted_at is None
+    assert controller.stats()['timeouts'] == 1
+
+
+def test_cancel_wakes_waiter():
+    controller = AdmissionController(max_concurrent=1)
+    blocker = controller.enqueue('blocker')
+    waiting = controller.enqueue('user')
+    errors = []
+
+    def wait():
+        try:
+            controller.wait(waiting, timeout=5)
+        except AdmissionCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    controller.cancel(waiting)
+    thread.join(2)
+    assert not thread.is_alive() and len(errors) == 1
+    controller.release(blocker)
+    assert waiting.admitted_at is None
@@ -0,0 +1,55 @@
+import numpy as np
+from PIL import Image
+
+from config import LOGO_PATH
+from utils import combine_images, logo_cache
+from compositor import combine_images_batch, composite_batch
+
+
+def random_covers(count, size=(640, 360), seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (count, size[1], size[0], 3), dtype=np.uint8)
+
+
+def gradient_logo(size=(200, 80)):
+    """alpha 从 0 到 255 渐变的 logo，覆盖所有半透明的舍入情况"""
+    width, height = size
+    rng = np.random.default_rng(1)
+    rgb = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    alpha = np.broadcast_to(np.linspace(0, 255, width).astype(np.uint8), (height, width))[..., None]
+    return Image.fromarray(np.concatenate([rgb, alpha], axis=-1), 'RGBA')
+
+
+def test_composite_batch_matches_combine_images():
+    covers = random_covers(4)
+    for logo_img in (gradient_logo(), LOGO_PATH):
+        for x_pos, y_pos in ((90, 90), (0, 0), (50, 30)):
+            expected = [np.asarray(combine_images(Image.fromarray(cover), logo_img, x_pos, y_pos))
+                        for cover in covers]
+            prepared = logo_cache.prepare(logo_img, int(covers.shape[2] * 0.15))
+            actual = composite_batch(covers.copy(), prepared, x_pos, y_pos)
+            assert np.array_equal(actual, np.stack(expected)), (logo_img, x_pos, y_pos)
+
+
+def test_combine_images_batch_matches_combine_images():
+    # 尺寸不同的封面分组处理，opacity 和 trim 与逐张合成一致
+    covers = [Image.fromarray(cover) for cover in random_covers(3)]
+    covers += [Image.fromarray(cover) for cover in random_covers(2, size=(500, 500), seed=2)]
+    covers.append(Image.fromarray(random_covers(1, seed=3)[0]).convert('RGBA'))
+    logo = gradient_logo()
+    options = dict(x_pos=20, y_pos=70, size_percent=25, opacity=60, trim=True)
+
+    expected = [combine_images(cover, logo, **options) for cover in covers]
+    actual = combine_images_batch([cover.copy() for cover in covers], logo, **options)
+    for a, b in zip(expected, actual):
+        assert a.mode == b.mode == 'RGB'
+        assert np.array_equal(np.asarray(a), np.asarray(b))
+
+
+def test_oversized_logo_is_clipped():
+    covers = random_covers(2)
+    # logo 比封面还宽时位置为负，超出的部分被裁掉
+    prepared = logo_cache.prepare(gradient_logo(), covers.shape[2] * 2)
+    expected = [np.asarray(combine_images(Image.fromarray(cover), gradient_logo(), size_percent=200))
+                for cover in covers]
+    assert np.array_equal(composite_batch(covers.copy(), prepared), np.stack(expected))
@@ -0,0 +1,34 @@
+from content_extractor import ParsedPage
+
+BODY = '<p>' + '这是正文内容，足够长才会被当作正文。' * 20 + '</p>'
+HTML = f"""
+<html><body>
+  <nav><ul class="menu"><li>首页</li></ul></nav>
+  <div class="rich_media">{BODY}</div>
+  <ul class="post-list"><li>{BODY}</li></ul>
+  <span class="inline-article">{BODY}</span>
+</body></html>
+"""
+
+
+def test_content_selectors_use_strained_tree():
+    page = ParsedPage(HTML, ['.rich_media', 'div.rich_media', '.missing'])
+    assert page.select('.rich_media').name == 'div'
+    assert page.select('div.rich_media') is page.select('.rich_media')
+    assert page.select('.missing') is None
+    # 只有类名/ID 的选择器找不到时不重新解析整个网页
+    assert page.full_soup is None
+
+
+def test_structural_selectors_fall_back_to_full_parse():
+    page = ParsedPage(HTML, ['ul.post-list'])
+    assert page.select('ul.post-list') is not None
+    assert page.select('body > div.rich_media')['class'] == ['rich_media']
+    assert page.select('span.inline-article') is not None
+    assert page.select_text('ul.post-list') is not None
+    assert page.select('body > ul.missing') is None
+
+
+def test_invalid_selector_returns_none():
+    page = ParsedPage(HTML)
+    assert page.select('div[') is None
@@ -0,0 +1,75 @@
+import time
+from types import SimpleNamespace
+
+import image_generator
+from admission import AdmissionController
+from image_cache import ImageCache
+
+
+class FakePrediction:
+    def __init__(self, finish_after):
+        self.id = 'p1'
+        self.status = 'starting'
+        self.output = None
+        self.error = None
+        self.polls = 0
+        self.finish_after = finish_after
+        self.cancelled = False
+
+    def reload(self):
+        self.polls += 1
+        if self.finish_after is not None and self.polls >= self.finish_after:
+            self.status, self.output = 'succeeded', ['https://example.com/image.webp']
+
+    def cancel(self):
+        self.cancelled = True
+        self.status = 'canceled'
+
+
+def fake_replicate(monkeypatch, tmp_path, finish_after):
+    """假的 Replicate 客户端和下载会话，准入控制和图片缓存换成新的实例"""
+    prediction = FakePrediction(finish_after)
+    client = SimpleNamespace(predictions=SimpleNamespace(create=lambda **kwargs: prediction))
+    response = SimpleNamespace(content=b'image-bytes', raise_for_status=lambda: None)
+    session = SimpleNamespace(get=lambda url, timeout: response)
+    admission = AdmissionController(max_concurrent=1)
+    monkeypatch.setattr(image_generator, 'get_replicate_client', lambda: client)
+    monkeypatch.setattr(image_generator, 'get_download_session', lambda: session)
+    monkeypatch.setattr(image_generator, 'admission', admission)
+    cache = ImageCache(str(tmp_path))
+    monkeypatch.setattr(image_generator, 'get_image_cache', lambda: cache)
+    monkeypatch.setattr(image_generator, 'IMAGE_POLL_INTERVAL', 0.01)
+    return prediction, admission
+
+
+def test_prediction_is_polled_until_done(monkeypatch, tmp_path):
+    prediction, admission = fake_replicate(monkeypatch, tmp_path, finish_after=3)
+    data, cached = image_generator._generate_image('a cat', timeout=5)
+    assert (data, cached) == (b'image-bytes', False)
+    assert prediction.polls == 3
+    assert admission.in_flight == 0
+    # 第二次命中缓存，不再调用模型
+    assert image_generator._generate_image('a cat', timeout=5) == (b'image-bytes', True)
+
+
+def test_timeout_cancels_prediction_and_frees_slot(monkeypatch, tmp_path):
+    prediction, admission = fake_replicate(monkeypatch, tmp_path, finish_after=None)
+    try:
+        image_generator._generate_image('a dog', timeout=0.1)
+        assert False, "应该超时"
+    except TimeoutError:
+        pass
+    assert prediction.cancelled
+    assert admission.in_flight == 0
+
+
+def test_iter_images_reports_timeout(monkeypatch, tmp_path):
+    prediction, admission = fake_replicate(monkeypatch, tmp_path, finish_after=None)
+    results = list(image_generator.iter_images(['a bird'], timeout=0.2))
+    assert len(results) == 1 and not results[0].ok
+    # 工作线程在超时后取消预测并归还名额，不会一直占用
+    for _ in range(100):
+        if admission.in_flight == 0:
+            break
+        time.sleep(0.01)
+    assert prediction.cancelled and admission.in_flight == 0
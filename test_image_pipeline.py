@@ -0,0 +1,26 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from image_pipeline import COVER_SIZE, CoverPipeline, cover_box, crop_to_cover
+
+
+def test_cover_box_keeps_center():
+    # 比封面窄的图片上下裁剪，多出的一个像素留在下边；比封面宽的图片左右裁剪
+    assert cover_box((1344, 768), COVER_SIZE) == (0, 98, 1344, 669)
+    assert cover_box((2000, 500), COVER_SIZE) == (413, 0, 1587, 500)
+    assert cover_box((900, 383), COVER_SIZE) == (0, 0, 900, 383)
+
+
+def test_pipeline_matches_reference_crop():
+    x = np.linspace(0, 255, 1344, dtype=np.float32)
+    y = np.linspace(0, 255, 768, dtype=np.float32)[:, None]
+    pixels = np.stack([np.broadcast_to(x, (768, 1344)), np.broadcast_to(y, (768, 1344)), (x + y) / 2], axis=-1)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels.astype(np.uint8)).save(buffer, 'PNG')
+
+    expected = np.asarray(crop_to_cover(Image.open(io.BytesIO(buffer.getvalue()))), dtype=np.int16)
+    actual = np.asarray(CoverPipeline().process(buffer.getvalue()), dtype=np.int16)
+    assert actual.shape == expected.shape == (COVER_SIZE[1], COVER_SIZE[0], 3)
+    assert np.abs(actual - expected).mean() < 1
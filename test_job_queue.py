@@ -0,0 +1,130 @@
+import io
+import time
+
+import pytest
+from PIL import Image
+
+import job_queue
+from job_queue import JobQueue, JobStore, QUEUED, RUNNING, DONE, generation_flights
+from image_generator import ImageResult
+from similarity_index import SimilarityIndex
+
+ARTICLE = "这是一篇用来测试后台任务的文章，讨论老旧小区改造中的居民参与机制和社区营造。" * 4
+PARAMS = {'regenerate': False, 'priority': False, 'format': 'PNG'}
+
+
+def sample_image() -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (1344, 768), (10, 120, 200)).save(buffer, 'WEBP')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def calls(monkeypatch, tmp_path):
+    """提示词和图片生成换成本地的假实现，相似文章索引换成临时数据库，返回调用记录"""
+    calls = {'prompts': 0, 'images': []}
+    data = sample_image()
+
+    def stream_prompts(article, regenerate=False):
+        calls['prompts'] += 1
+        yield from ['p1', 'p2', 'p3']
+
+    def iter_images(prompts, user_id=None, priority=False, on_status=None):
+        for index, prompt in enumerate(prompts):
+            time.sleep(0.1)
+            calls['images'].append((prompt, priority))
+            yield ImageResult(index, prompt, data=data)
+
+    monkeypatch.setattr(job_queue, 'stream_prompts', stream_prompts)
+    monkeypatch.setattr(job_queue, 'iter_images', iter_images)
+    index = SimilarityIndex(str(tmp_path / 'similar.db'))
+    monkeypatch.setattr(job_queue, 'get_similarity_index', lambda: index)
+    return calls
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    """创建使用临时数据库的任务队列，测试结束时停止工作线程"""
+    queues = []
+
+    def make(**kwargs):
+        queue = JobQueue(JobStore(str(tmp_path / 'jobs.db')), **kwargs)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.close(timeout=10)
+        assert not any(thread.is_alive() for thread in queue.threads)
+
+
+def wait_finished(queue, job_ids, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        jobs = [queue.get(job_id) for job_id in job_ids]
+        if all(job.finished for job in jobs):
+            return jobs
+        time.sleep(0.05)
+    raise AssertionError(f"任务没有在 {timeout} 秒内结束: {[job.status for job in jobs]}")
+
+
+def test_identical_jobs_are_coalesced(calls, make_queue):
+    queue = make_queue(workers=2)
+    followers = generation_flights.stats()['followers']
+    # 清理后内容相同的文章视为同一篇
+    job_ids = [queue.submit('a', ARTICLE, PARAMS), queue.submit('b', ARTICLE + '\n\n', PARAMS)]
+    jobs = wait_finished(queue, job_ids)
+
+    assert [job.status for job in jobs] == [DONE, DONE]
+    assert calls['prompts'] == 1
+    assert [prompt for prompt, _ in calls['images']] == ['p1', 'p2', 'p3']
+    assert generation_flights.stats()['followers'] == followers + 1
+    for job_id in job_ids:
+        covers = queue.covers(job_id)
+        assert [cover.ok for cover in covers] == [True] * 3
+        assert queue.cover_data(job_id, covers[0].name).startswith(b'\x89PNG')
+
+
+def test_priority_jobs_do_not_join_normal_flight(calls, make_queue):
+    queue = make_queue(workers=2)
+    job_ids = [queue.submit('a', ARTICLE, PARAMS), queue.submit('vip', ARTICLE, {**PARAMS, 'priority': True})]
+    wait_finished(queue, job_ids)
+
+    assert calls['prompts'] == 2
+    assert sorted(priority for _, priority in calls['images']) == [False] * 3 + [True] * 3
+
+
+def test_restart_recovers_abandoned_jobs(calls, make_queue, tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.db'))
+    now = time.time()
+    # 排队中的任务、执行者已退出（租约过期）的任务、其他进程正在执行（租约有效）的任务
+    store.create('queued', 'a', ARTICLE, PARAMS, None, now)
+    store.create('expired', 'b', ARTICLE + '过期', PARAMS, None, now)
+    assert store.claim('expired', 'dead-process', now - 120, 60)
+    store.create('alive', 'c', ARTICLE + '执行中', PARAMS, None, now)
+    assert store.claim('alive', 'other-process', now, 600)
+
+    queue = make_queue(workers=2)
+    jobs = wait_finished(queue, ['queued', 'expired'])
+    assert [job.status for job in jobs] == [DONE, DONE]
+    assert len(queue.covers('expired')) == 3
+
+    # 租约有效的任务不会被接手，也不会被重复执行
+    time.sleep(0.2)
+    assert queue.get('alive').status == RUNNING
+    assert calls['prompts'] == 2
+    # 原来的执行者结束时能正常写入状态，接手的进程结束旧任务时不会覆盖
+    store.finish('alive', 'other-process', DONE)
+    store.finish('expired', 'dead-process', QUEUED)
+    assert queue.get('alive').status == DONE
+    assert queue.get('expired').status == DONE
+    store.close()
+
+
+def test_close_leaves_queued_jobs_for_next_queue(calls, make_queue):
+    queue = make_queue(workers=1)
+    queue.close(timeout=10)
+    # 关闭后提交的任务留在数据库中，下一个队列接手
+    job_id = queue.submit('a', ARTICLE, PARAMS)
+    assert queue.get(job_id).status == QUEUED
+    assert wait_finished(make_queue(workers=1), [job_id])[0].status == DONE
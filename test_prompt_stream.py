@@ -0,0 +1,90 @@
+from itertools import count
+from types import SimpleNamespace
+
+import pytest
+
+import utils
+from prompt_cache import PromptCache
+
+ARTICLE = "这是一篇用来测试提示词生成的文章，内容足够长。" * 5
+
+
+@pytest.fixture
+def fake_deepseek(monkeypatch, tmp_path):
+    """返回一个函数，把 DeepSeek 客户端换成按给定分片流式返回的假客户端，缓存换成新的临时目录"""
+    cache_ids = count()
+
+    def install(chunks, error=None):
+        calls = []
+
+        def create(**kwargs):
+            calls.append(kwargs)
+            if error:
+                raise error
+            for content in chunks:
+                delta = SimpleNamespace(content=content)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        monkeypatch.setattr(utils, 'get_deepseek_client', lambda: client)
+        cache = PromptCache(str(tmp_path / f'prompts{next(cache_ids)}'))
+        monkeypatch.setattr(utils, 'get_prompt_cache', lambda: cache)
+        return calls
+
+    return install
+
+
+def test_split_on_delimiter_across_chunks(fake_deepseek):
+    # 分隔符被拆在两个分片之间
+    fake_deepseek(["first prompt #", "## second", " prompt ##", "# third prompt"])
+    assert list(utils.stream_prompts(ARTICLE)) == ['first prompt', 'second prompt', 'third prompt']
+
+
+def test_split_on_longer_delimiter(fake_deepseek):
+    # 模型输出 #### 时下一个提示词不能以 # 开头
+    fake_deepseek(["a cat ###", "# a dog ####", "#", " a bird ####"])
+    assert list(utils.stream_prompts(ARTICLE)) == ['a cat', 'a dog', 'a bird']
+
+
+def test_extra_prompts_are_dropped(fake_deepseek):
+    fake_deepseek(["one ### two ### three ### four ### five"])
+    assert list(utils.stream_prompts(ARTICLE)) == ['one', 'two', 'three']
+
+
+def test_pad_with_default_prompts(fake_deepseek):
+    fake_deepseek(["only one prompt"])
+    prompts = list(utils.stream_prompts(ARTICLE))
+    assert prompts == ['only one prompt'] + utils.DEFAULT_PROMPTS[1:]
+
+
+def test_pad_on_error(fake_deepseek):
+    fake_deepseek([], error=RuntimeError("network down"))
+    assert list(utils.stream_prompts(ARTICLE)) == utils.DEFAULT_PROMPTS
+
+
+def test_generated_count_excludes_padding(fake_deepseek):
+    fake_deepseek(["only one prompt"])
+    assert utils.generated_count(list(utils.stream_prompts(ARTICLE))) == 1
+    fake_deepseek([], error=RuntimeError("network down"))
+    assert utils.generated_count(list(utils.stream_prompts(ARTICLE))) == 0
+    fake_deepseek(["a ### b ### c"])
+    assert utils.generated_count(list(utils.stream_prompts(ARTICLE))) == 3
+
+
+def test_complete_result_is_cached(fake_deepseek):
+    calls = fake_deepseek(["a ### b ### c"])
+    first = list(utils.stream_prompts(ARTICLE))
+    second = list(utils.stream_prompts(ARTICLE))
+    assert first == second == ['a', 'b', 'c']
+    assert len(calls) == 1
+
+    # 重新生成时跳过缓存
+    list(utils.stream_prompts(ARTICLE, regenerate=True))
+    assert len(calls) == 2
+
+
+def test_padded_result_is_not_cached(fake_deepseek):
+    calls = fake_deepseek(["a ### b"])
+    list(utils.stream_prompts(ARTICLE))
+    list(utils.stream_prompts(ARTICLE))
+    assert len(calls) == 2
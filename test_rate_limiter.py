@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from datetime import datetime
+
+from rate_limiter import SQLiteStore
+
+WINDOW = 24 * 3600
+
+
+def test_limit_under_concurrency():
+    # 两个存储实例（各自的连接，相当于两个进程）的多个线程同时抢同一个用户的名额
+    limit, threads, attempts = 50, 16, 20
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'usage.db')
+        stores = [SQLiteStore(path), SQLiteStore(path)]
+        allowed = []
+        lock = threading.Lock()
+        start = threading.Barrier(threads)
+        now = time.time()
+
+        def worker(store):
+            start.wait()
+            for _ in range(attempts):
+                ok, count, _ = store.check_and_increment('user', limit, now, WINDOW)
+                assert count <= limit
+                with lock:
+                    allowed.append(ok)
+
+        workers = [threading.Thread(target=worker, args=(stores[i % 2],)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        assert allowed.count(True) == limit
+        assert len(allowed) == threads * attempts
+        assert stores[0].get('user', now, WINDOW)[0] == limit
+
+
+def test_users_are_counted_separately():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStore(os.path.join(tmp, 'usage.db'))
+        now = time.time()
+        assert store.check_and_increment('a', 1, now, WINDOW)[0]
+        assert not store.check_and_increment('a', 1, now, WINDOW)[0]
+        assert store.check_and_increment('b', 1, now, WINDOW)[0]
+
+
+def test_window_expiry_resets_count():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStore(os.path.join(tmp, 'usage.db'))
+        now = time.time()
+        for _ in range(3):
+            store.check_and_increment('user', 3, now, WINDOW)
+        assert store.check_and_increment('user', 3, now + 10, WINDOW) == (False, 3, now)
+
+        later = now + WINDOW + 1
+        assert store.get('user', later, WINDOW) is None
+        assert store.check_and_increment('user', 3, later, WINDOW) == (True, 1, later)
+
+
+def test_zero_limit_denies():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStore(os.path.join(tmp, 'usage.db'))
+        now = time.time()
+        assert store.check_and_increment('user', 0, now, WINDOW) == (False, 0, now)
+        assert store.get('user', now, WINDOW) is None
+
+
+def test_import_json_keeps_valid_counts():
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, 'usage_data.json')
+        now = time.time()
+        with open(legacy, 'w') as f:
+            json.dump({
+                'fresh': {'count': 2, 'last_reset': datetime.fromtimestamp(now - 60).isoformat()},
+                'stale': {'count': 5, 'last_reset': datetime.fromtimestamp(now - WINDOW - 60).isoformat()},
+            }, f)
+        store = SQLiteStore(os.path.join(tmp, 'usage.db'))
+        store.import_json(legacy, WINDOW)
+
+        assert store.get('fresh', now, WINDOW)[0] == 2
+        assert store.get('stale', now, WINDOW) is None
+        assert not os.path.exists(legacy)
+        assert os.path.exists(legacy + '.migrated')
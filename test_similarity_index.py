@@ -0,0 +1,91 @@
+import os
+import time
+import tempfile
+
+from similarity_index import SimilarityIndex, simhash, FINGERPRINT_BITS
+from config import SIMILARITY_MIN_CHARS
+
+ARTICLE = ("城市更新不只是拆旧建新。老旧小区改造中，居民参与机制决定了改造能否真正落地。"
+           "本文结合三个社区的实践，讨论议事会、社区规划师和微更新项目如何让居民从旁观者变成参与者。") * 3
+OTHER = ("大模型推理的成本主要来自显存带宽。批处理、量化和投机解码分别从不同角度提高吞吐，"
+         "本文比较了这几种方法在不同请求长度下的效果，并给出部署时的选择建议。") * 3
+PROMPTS = ['p1', 'p2', 'p3']
+
+
+def new_index(tmp, **kwargs) -> SimilarityIndex:
+    return SimilarityIndex(os.path.join(tmp, 'similar.db'), **kwargs)
+
+
+def flip_bits(fingerprint: int, count: int) -> int:
+    for bit in range(count):
+        fingerprint ^= 1 << (bit * 5 % FINGERPRINT_BITS)
+    return fingerprint
+
+
+def test_near_duplicate_is_found():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = new_index(tmp)
+        index.add(ARTICLE, PROMPTS)
+        similar = index.lookup('转载｜' + ARTICLE + '\n欢迎关注本公众号。')
+        assert similar is not None
+        assert similar.prompts == PROMPTS
+        assert similar.digest == index.digest(ARTICLE)
+        assert 0 < similar.distance <= index.max_distance
+        assert index.lookup(OTHER) is None
+
+
+def test_distance_threshold():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = new_index(tmp, max_distance=8)
+        index.add(ARTICLE, PROMPTS)
+        fingerprint = simhash(ARTICLE)
+        assert index.lookup_fingerprint(fingerprint).distance == 0
+        assert index.lookup_fingerprint(flip_bits(fingerprint, 8)).distance == 8
+        assert index.lookup_fingerprint(flip_bits(fingerprint, 9)) is None
+
+
+def test_closest_entry_wins():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = new_index(tmp)
+        index.add(ARTICLE, PROMPTS)
+        index.add(ARTICLE + '补充一段新的内容，介绍了后续的回访情况。', ['q1', 'q2', 'q3'])
+        assert index.lookup(ARTICLE).prompts == PROMPTS
+
+
+def test_short_articles_are_ignored():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = new_index(tmp)
+        short = ARTICLE[:SIMILARITY_MIN_CHARS - 1]
+        index.add(short, PROMPTS)
+        assert index.stats()['entries'] == 0
+        index.add(ARTICLE, PROMPTS)
+        assert index.lookup(short) is None
+
+
+def test_entries_survive_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        new_index(tmp).add(ARTICLE, PROMPTS)
+        assert new_index(tmp).lookup(ARTICLE).prompts == PROMPTS
+
+
+def test_max_entries_evicts_least_recently_used():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = new_index(tmp, max_entries=2)
+        index.add(ARTICLE, PROMPTS)
+        index.add(OTHER, PROMPTS)
+        index.touch(index.digest(ARTICLE))
+        index.add(ARTICLE[::-1], PROMPTS)
+        assert index.lookup(ARTICLE) is not None
+        assert index.lookup(OTHER) is None
+        assert new_index(tmp, max_entries=2).stats()['entries'] == 2
+
+
+def test_expired_entries_are_pruned_on_insert():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = new_index(tmp, ttl_days=1)
+        index.add(ARTICLE, PROMPTS)
+        index.entries[index.digest(ARTICLE)]['last_used'] = time.time() - 2 * 24 * 3600
+        index.add(OTHER, PROMPTS)
+        assert index.lookup(ARTICLE) is None
+        assert index.stats()['evictions'] == 1
+        assert new_index(tmp).stats()['entries'] == 1
@@ -0,0 +1,134 @@
+import re
+import math
+from collections import Counter
+from typing import List
+
+from config import PROMPT_TOKEN_BUDGET
+
+# 句子切分：中英文句末标点之后
+SENTENCE_END_RE = re.compile(r'(?<=[。！？!?])|(?<=[.;；])\s+')
+
+# 关键词：中文按相邻两字，英文按单词
+CJK_RE = re.compile(r'[一-鿿]')
+CJK_RUN_RE = re.compile(r'[一-鿿]+')
+WORD_RE = re.compile(r'[A-Za-z][A-Za-z0-9\-]+')
+
+# 不作为关键词的高频英文虚词
+STOP_WORDS = {
+    'the', 'and', 'for', 'that', 'this', 'with', 'are', 'was', 'but', 'not', 'you',
+    'have', 'has', 'from', 'they', 'their', 'will', 'can', 'all', 'one', 'our', 'its'
+}
+
+# 没有句末标点、长度不超过这个值的段落视为标题或小标题
+HEADING_MAX_CHARS = 40
+
+# 标题和小标题最多占用的摘要预算比例，小标题很多的文章也要留出篇幅给正文
+HEADING_BUDGET_SHARE = 0.25
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 DeepSeek 的 token 数：中文约 0.6 个/字，其他字符约 0.3 个/字"""
+    cjk = len(CJK_RE.findall(text))
+    return math.ceil(cjk * 0.6 + (len(text) - cjk) * 0.3)
+
+
+def truncate_to_budget(text: str, token_budget: int) -> str:
+    """按 token 预算截断文本开头部分"""
+    used = 0.0
+    for index, char in enumerate(text):
+        used += 0.6 if CJK_RE.match(char) else 0.3
+        if used > token_budget:
+            return text[:index]
+    return text
+
+
+def _terms(text: str) -> List[str]:
+    """提取用于统计关键词的词项"""
+    terms = [w.lower() for w in WORD_RE.findall(text) if w.lower() not in STOP_WORDS]
+    for run in CJK_RUN_RE.findall(text):
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def _is_heading(paragraph: str) -> bool:
+    return len(paragraph) <= HEADING_MAX_CHARS and not re.search(r'[。！？!?.；;]$', paragraph)
+
+
+def condense_text(text: str, token_budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """
+    把文章压缩成不超过 token_budget 的摘要，保留段落结构
+    按重要性挑选句子：标题和小标题、开头段落、每段首句、关键词密度，
+    选中的句子按原文顺序输出。
+    :param text: clean_text 处理后的文章（段落之间用空行分隔）
+    :param token_budget: 摘要的 token 上限
+    """
+    if estimate_tokens(text) <= token_budget:
+        return text
+
+    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+
+    # (段落序号, 句子序号, 句子, 是否标题)
+    sentences = []
+    for p_index, paragraph in enumerate(paragraphs):
+        if _is_heading(paragraph):
+            sentences.append((p_index, 0, paragraph, True))
+            continue
+        parts = [s.strip() for s in SENTENCE_END_RE.split(paragraph) if s and s.strip()]
+        for s_index, sentence in enumerate(parts):
+            sentences.append((p_index, s_index, sentence, False))
+
+    # 关键词权重：全文词频，标题中的词额外加权（标题只在这里加权一次，
+    # 标题句本身和含有这些词的正文句子都因此得分更高）
+    frequency = Counter(_terms(text))
+    for p_index, _, sentence, is_heading in sentences:
+        if is_heading:
+            for term in _terms(sentence):
+                frequency[term] += 3 if p_index == 0 else 1
+
+    scored = []
+    for order, (p_index, s_index, sentence, is_heading) in enumerate(sentences):
+        terms = _terms(sentence)
+        density = sum(frequency[t] for t in terms) / math.sqrt(len(terms)) if terms else 0.0
+        score = density
+        if p_index == 0 or (p_index == 1 and _is_heading(paragraphs[0])):
+            score *= 1.5  # 开头段落
+        if s_index == 0:
+            score *= 1.3  # 段落首句
+        scored.append((score, order, estimate_tokens(sentence), is_heading))
+
+    # 文章标题最先选入，其余按分数从高到低挑选，直到用完预算（每句多算 1 个 token 留给分隔符），
+    # 标题和小标题合计不超过 HEADING_BUDGET_SHARE
+    selected = set()
+    used = 0
+    heading_used = 0
+    heading_budget = token_budget * HEADING_BUDGET_SHARE
+    ranked = sorted(scored, key=lambda item: (item[1] == 0 and item[3], item[0]), reverse=True)
+    for score, order, tokens, is_heading in ranked:
+        if used + tokens + 1 > token_budget:
+            continue
+        if is_heading:
+            if heading_used + tokens + 1 > heading_budget:
+                continue
+            heading_used += tokens + 1
+        selected.add(order)
+        used += tokens + 1
+
+    # 句子都太长放不下时，直接截断开头部分
+    if not selected:
+        return truncate_to_budget(text, token_budget)
+
+    # 按原文顺序输出，同一段落的句子放在一起
+    digest = []
+    current_paragraph = None
+    for order, (p_index, _, sentence, _) in enumerate(sentences):
+        if order not in selected:
+            continue
+        if p_index != current_paragraph:
+            digest.append([])
+            current_paragraph = p_index
+        digest[-1].append(sentence)
+
+    return '\n\n'.join(
+        ''.join(parts) if CJK_RE.search(parts[0]) else ' '.join(parts)
+        for parts in digest
+    )
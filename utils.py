@@ -1,28 +1,25 @@
-import requests
-from PIL import Image
+import re
+import json
 from config import *
-from openai import OpenAI
+from http_clients import get_deepseek_client
+from prompt_cache import PromptCache, get_prompt_cache
+from logo_cache import LogoCache
+from text_condenser import condense_text
 
-def generate_prompts(article_text):
-    """使用Deepseek生成图像提示词"""
-    # 定义默认提示词
-    default_prompts = [
-        "A modern tech command center with holographic displays showing Python code, cyberpunk style, blue and red neon lighting, highly detailed 8k rendering",
-        "Futuristic learning environment with flowing data streams, abstract neural networks, cool blue tones with bright accent lights, professional style",
-        "High-tech classroom with dynamic lighting, modern minimalist design, subtle gradients from deep blue to purple, clean professional atmosphere"
-    ]
-    
-    try:
-        client = OpenAI(
-            api_key=DEEPSEEK_API_KEY,
-            base_url="https://api.deepseek.com"
-        )
-        
-        # 确保文本是 UTF-8 编码
-        if isinstance(article_text, bytes):
-            article_text = article_text.decode('utf-8')
-        
-        system_prompt = """你是一个专业的AI艺术提示词专家。
+# 每篇文章生成的提示词数量
+PROMPT_COUNT = 3
+
+# 提示词之间的分隔符，模型偶尔会输出 #### 或更多个 #
+PROMPT_DELIMITER_RE = re.compile(r'#{3,}')
+
+# 定义默认提示词
+DEFAULT_PROMPTS = [
+    "A modern tech command center with holographic displays showing Python code, cyberpunk style, blue and red neon lighting, highly detailed 8k rendering",
+    "Futuristic learning environment with flowing data streams, abstract neural networks, cool blue tones with bright accent lights, professional style",
+    "High-tech classroom with dynamic lighting, modern minimalist design, subtle gradients from deep blue to purple, clean professional atmosphere"
+]
+
+SYSTEM_PROMPT = """你是一个专业的AI艺术提示词专家。
         请根据给定的文章内容，生成3个不同的英文提示词，用于AI绘图。
         要求：
         1. 提示词要体现文章的核心内容和主题
@@ -30,65 +27,212 @@ def generate_prompts(article_text):
         3. 要加入具体的艺术风格描述，如lighting, color scheme等
         4. 每个提示词长度在100-150字之间
         5. 直接返回3个提示词，每个提示词用 ### 分隔，不要加序号或其他标记"""
+
+PROMPT_TEMPERATURE = 0.7
+
+BATCH_SYSTEM_PROMPT = """你是一个专业的AI艺术提示词专家。
+        下面有多篇文章，每篇以 === 文章 编号 === 开头。请为每篇文章分别生成3个不同的英文提示词，用于AI绘图。
+        要求：
+        1. 提示词要体现对应文章的核心内容和主题
+        2. 风格要现代、科技感、未来感
+        3. 要加入具体的艺术风格描述，如lighting, color scheme等
+        4. 每个提示词长度在100-150字之间
+        5. 只返回JSON，格式为 {"results": [{"id": 文章编号, "prompts": ["提示词1", "提示词2", "提示词3"]}]}"""
+
+# 进程内共享的处理好的 Logo 缓存，预览和每张封面复用同一份
+logo_cache = LogoCache()
+
+def stream_prompts(article_text, regenerate=False):
+    """
+    流式生成图像提示词
+    每收到一个 ### 分隔符就立即产出一个提示词，调用方可以在模型继续输出时开始生成图片。
+    不足3个时用默认提示词补齐。
+    :param regenerate: 为 True 时跳过缓存，重新调用模型（新结果仍会写入缓存）
+    """
+    cache_key = PromptCache.make_key(article_text, SYSTEM_PROMPT, PROMPT_TEMPERATURE)
+    if not regenerate:
+        cached = get_prompt_cache().get(cache_key)
+        if cached:
+            yield from cached
+            return
+    
+    emitted = 0
+    generated = []
+    try:
+        client = get_deepseek_client()
+        
+        # 确保文本是 UTF-8 编码
+        if isinstance(article_text, bytes):
+            article_text = article_text.decode('utf-8')
+        
+        # 长文章先压缩成摘要，控制发给模型的 token 数
+        digest = condense_text(article_text)
         
-        response = client.chat.completions.create(
+        stream = client.chat.completions.create(
             model="deepseek-chat",
             messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"请根据以下文章生成提示词：\n\n{article_text}"}
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": f"请根据以下文章生成提示词：\n\n{digest}"}
             ],
-            temperature=0.7
+            temperature=PROMPT_TEMPERATURE,
+            stream=True
         )
         
-        # 处理返回的提示词
-        content = response.choices[0].message.content.strip()
-        prompts = [p.strip() for p in content.split('###') if p.strip()]
+        buffer = ''
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            buffer += chunk.choices[0].delta.content or ''
+            # 分隔符一到就把前面的提示词交出去；分隔符在缓冲区末尾时后面可能还有 #，等下一段再切
+            while emitted < PROMPT_COUNT:
+                match = PROMPT_DELIMITER_RE.search(buffer)
+                if match is None or match.end() == len(buffer):
+                    break
+                prompt, buffer = buffer[:match.start()], buffer[match.end():]
+                prompt = prompt.strip()
+                if prompt:
+                    emitted += 1
+                    generated.append(prompt)
+                    yield prompt
+            if emitted >= PROMPT_COUNT:
+                break
         
-        # 确保有3个提示词
-        while len(prompts) < 3:
-            prompts.append(default_prompts[len(prompts)])
-            
-        return prompts[:3]  # 确保只返回3个提示词
+        # 最后一个提示词后面没有分隔符，或者只剩结尾的分隔符
+        for prompt in PROMPT_DELIMITER_RE.split(buffer):
+            prompt = prompt.strip()
+            if prompt and emitted < PROMPT_COUNT:
+                emitted += 1
+                generated.append(prompt)
+                yield prompt
         
+        # 只缓存模型完整返回的结果，补齐的默认提示词不缓存
+        if len(generated) == PROMPT_COUNT:
+            get_prompt_cache().put(cache_key, generated)
+            
     except Exception as e:
         print(f"生成提示词时出错: {str(e)}")
-        return default_prompts  # 发生错误时返回默认提示词
+    
+    # 确保有3个提示词
+    while emitted < PROMPT_COUNT:
+        yield DEFAULT_PROMPTS[emitted]
+        emitted += 1
+
+def generate_prompts(article_text, regenerate=False):
+    """使用Deepseek生成图像提示词"""
+    return list(stream_prompts(article_text, regenerate=regenerate))
+
+def generated_count(prompts):
+    """
+    提示词中由模型实际生成的个数
+    出错或不足3个时补齐的默认提示词总在末尾、与 DEFAULT_PROMPTS 位置相同，不计入
+    """
+    count = 0
+    for prompt, default in zip(prompts, DEFAULT_PROMPTS):
+        if prompt == default:
+            break
+        count += 1
+    return count
+
+def _parse_batch_response(content, count):
+    """解析批量请求返回的JSON，返回 {文章编号: 提示词列表}，格式不对的文章不包含在内"""
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return {}
+    
+    parsed = {}
+    results = data.get('results') if isinstance(data, dict) else None
+    for entry in results or []:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            index = int(entry.get('id'))
+        except (TypeError, ValueError):
+            continue
+        prompts = entry.get('prompts')
+        if not (0 <= index < count and isinstance(prompts, list)):
+            continue
+        prompts = [p.strip() for p in prompts if isinstance(p, str) and p.strip()]
+        if len(prompts) >= PROMPT_COUNT:
+            parsed[index] = prompts[:PROMPT_COUNT]
+    return parsed
+
+def generate_prompts_batch(articles, batch_size=PROMPT_BATCH_SIZE):
+    """
+    批量生成提示词：把多篇文章压缩后放进同一个请求，按文章拆分结果
+    已缓存的文章直接返回；某篇文章解析失败时单独调用 generate_prompts
+    :param articles: 文章列表
+    :return: 与 articles 顺序一致的提示词列表
+    """
+    results = [None] * len(articles)
+    # 批量结果来自不同的系统提示词和更短的摘要，与单篇生成分开缓存
+    batch_prompt = f"{BATCH_SYSTEM_PROMPT}\0{PROMPT_BATCH_TOKEN_BUDGET}"
+    keys = [PromptCache.make_key(article, batch_prompt, PROMPT_TEMPERATURE) for article in articles]
+    # 每篇文章的输出都要放进同一个回复，批次大小不能超过模型的输出上限
+    batch_size = max(1, min(batch_size, DEEPSEEK_MAX_OUTPUT_TOKENS // PROMPT_BATCH_OUTPUT_TOKENS))
+    
+    pending = []
+    for index, key in enumerate(keys):
+        cached = get_prompt_cache().get(key)
+        if cached:
+            results[index] = cached
+        else:
+            pending.append(index)
+    
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        parsed = {}
+        try:
+            sections = '\n\n'.join(
+                f"=== 文章 {i} ===\n{condense_text(articles[index], PROMPT_BATCH_TOKEN_BUDGET)}"
+                for i, index in enumerate(chunk)
+            )
+            response = get_deepseek_client().chat.completions.create(
+                model="deepseek-chat",
+                messages=[
+                    {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"请根据以下文章生成提示词：\n\n{sections}"}
+                ],
+                temperature=PROMPT_TEMPERATURE,
+                response_format={"type": "json_object"},
+                max_tokens=min(DEEPSEEK_MAX_OUTPUT_TOKENS, len(chunk) * PROMPT_BATCH_OUTPUT_TOKENS)
+            )
+            parsed = _parse_batch_response(response.choices[0].message.content, len(chunk))
+        except Exception as e:
+            print(f"批量生成提示词时出错: {str(e)}")
+        
+        for i, index in enumerate(chunk):
+            if i in parsed:
+                get_prompt_cache().put(keys[index], parsed[i])
+                results[index] = parsed[i]
+            else:
+                results[index] = generate_prompts(articles[index])
+    
+    return results
 
-def combine_images(cover_img, logo_img, x_pos=90, y_pos=90, size_percent=15, opacity=100):
+def combine_images(cover_img, logo_img, x_pos=90, y_pos=90, size_percent=15, opacity=100, trim=False):
     """
     将logo添加到封面图片上
     
     参数:
     - cover_img: 封面图片
-    - logo_img: logo图片
+    - logo_img: logo图片，也可以是文件路径、字节或上传的文件
     - x_pos: logo水平位置（0-100）
     - y_pos: logo垂直位置（0-100）
     - size_percent: logo大小（占图片宽度的百分比）
     - opacity: logo不透明度（0-100）
+    - trim: 是否先裁掉logo四周的透明边缘
     """
-    # 转换为RGBA模式以支持透明度
-    cover_img = cover_img.convert('RGBA')
-    logo_img = logo_img.convert('RGBA')
-    
-    # 计算logo的目标大小
-    target_width = int(cover_img.width * (size_percent / 100))
-    aspect_ratio = logo_img.width / logo_img.height
-    target_height = int(target_width / aspect_ratio)
-    
-    # 调整logo大小
-    logo_img = logo_img.resize((target_width, target_height), Image.Resampling.LANCZOS)
-    
-    # 计算实际位置
-    x = int((cover_img.width - target_width) * x_pos / 100)
-    y = int((cover_img.height - target_height) * y_pos / 100)
-    
-    # 处理透明度
-    if opacity < 100:
-        logo_img.putalpha(Image.new('L', logo_img.size, int(255 * opacity / 100)))
-    
-    # 创建新图片
-    final_img = Image.new('RGBA', cover_img.size)
-    final_img.paste(cover_img, (0, 0))
-    final_img.paste(logo_img, (x, y), logo_img)
-    
-    return final_img.convert('RGB')  # 转回RGB模式 
\ No newline at end of file
+    # 同一个logo在同样的尺寸和透明度下只处理一次
+    logo = logo_cache.prepare(logo_img, int(cover_img.width * (size_percent / 100)), opacity, trim=trim)
+    return paste_logo(cover_img.convert('RGB'), logo, x_pos, y_pos)
+
+
+def paste_logo(cover_img, logo, x_pos=90, y_pos=90):
+    """
+    把处理好的 RGBA logo 按位置百分比直接粘贴到 RGB 封面上（会修改 cover_img）
+    """
+    x = int((cover_img.width - logo.width) * x_pos / 100)
+    y = int((cover_img.height - logo.height) * y_pos / 100)
+    cover_img.paste(logo, (x, y), logo)
+    return cover_img